@@ -0,0 +1,154 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscription
+
+User = get_user_model()
+
+CATALOG_VERSION_KEY = 'recipe:catalog'
+
+
+def catalog_version():
+    """Момент последней правки тегов или ингредиентов.
+
+    Названия тегов и ингредиентов вложены в закешированные рецепты, но
+    их правка не трогает Recipe.updated_at. Если ключ вытеснен, версия
+    начинается заново с текущего момента — старые записи просто не найдутся.
+    """
+    return cache.get_or_set(
+        CATALOG_VERSION_KEY, time.time, settings.RECIPE_CACHE_TIMEOUT
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_catalog_version(**kwargs):
+    cache.set(CATALOG_VERSION_KEY, time.time(), settings.RECIPE_CACHE_TIMEOUT)
+
+
+def recipe_versions(recipes, fields=None):
+    """Всё, от чего зависит представление рецепта, кроме флагов
+    пользователя: {pk: (updated_at, updated_at автора или None, каталог)}.
+    """
+    catalog = catalog_version()
+    if fields is not None and 'author' not in fields:
+        return {recipe.pk: (recipe.updated_at, None, catalog)
+                for recipe in recipes}
+    missing = {recipe.author_id for recipe in recipes
+               if not Recipe.author.is_cached(recipe)}
+    authors = dict(User.objects.filter(pk__in=missing).values_list(
+        'pk', 'updated_at'
+    )) if missing else {}
+    return {
+        recipe.pk: (
+            recipe.updated_at,
+            recipe.author.updated_at if Recipe.author.is_cached(recipe)
+            else authors.get(recipe.author_id),
+            catalog,
+        )
+        for recipe in recipes
+    }
+
+
+def last_modified(version):
+    updated_at, author_updated_at, catalog = version
+    return max(filter(None, (
+        updated_at, author_updated_at,
+        datetime.fromtimestamp(catalog, timezone.utc),
+    )))
+
+
+def version_string(version):
+    return ':'.join(
+        str(part.timestamp() if isinstance(part, datetime) else part)
+        for part in version
+    )
+
+
+def recipe_cache_key(pk, version, request=None, fields=None):
+    base_url = request.build_absolute_uri('/') if request is not None else ''
+    return 'recipe:{}:{}:{}:{}'.format(
+        pk, version_string(version), base_url, ','.join(fields or ())
+    )
+
+
+def recipe_cache_keys(recipes, request=None, fields=None):
+    return {
+        pk: recipe_cache_key(pk, version, request, fields)
+        for pk, version in recipe_versions(recipes, fields).items()
+    }
+
+
+def get_cached_representations(recipes, request=None, fields=None):
+    keys = {key: pk for pk, key in recipe_cache_keys(
+        recipes, request, fields
+    ).items()}
+    return {
+        keys[key]: data for key, data in cache.get_many(keys).items()
+    }
+
+
+def cache_representations(representations, request=None, fields=None):
+    keys = recipe_cache_keys(
+        [recipe for recipe, _ in representations], request, fields
+    )
+    cache.set_many(
+        {keys[recipe.pk]: data for recipe, data in representations},
+        settings.RECIPE_CACHE_TIMEOUT
+    )
+
+
+class UserFlags:
+    """Флаги текущего пользователя для набора рецептов.
+
+    Собираются тремя запросами на всю страницу и накладываются
+    на закешированное представление рецепта.
+    """
+
+    def __init__(self, user, recipes, fields=None):
+        self.favorited = set()
+        self.in_shopping_cart = set()
+        self.subscribed = set()
+        if user is None or user.is_anonymous or not recipes:
+            return
+        fields = fields or ('is_favorited', 'is_in_shopping_cart', 'author')
+        recipe_ids = [recipe.pk for recipe in recipes]
+        author_ids = {recipe.author_id for recipe in recipes}
+        if 'is_favorited' in fields:
+            self.favorited = set(Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+        if 'is_in_shopping_cart' in fields:
+            self.in_shopping_cart = set(ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+        if 'author' in fields:
+            self.subscribed = set(Subscription.objects.filter(
+                subscriber=user, user_id__in=author_ids
+            ).values_list('user_id', flat=True))
+
+    def apply(self, recipe, data):
+        data = data.copy()
+        if 'is_favorited' in data:
+            data['is_favorited'] = recipe.pk in self.favorited
+        if 'is_in_shopping_cart' in data:
+            data['is_in_shopping_cart'] = recipe.pk in self.in_shopping_cart
+        if 'author' in data:
+            author = data['author'].copy()
+            author['is_subscribed'] = recipe.author_id in self.subscribed
+            data['author'] = author
+        return data
+
+
+def make_etag(*parts):
+    """Сильный ETag из значений, от которых зависит ответ."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
@@ -0,0 +1,139 @@
+"""Ручные версии горячих сериализаторов.
+
+Строят тот же вывод, что RecipeSerializer и SubscriptionSerializer,
+но из .values() и без полей DRF. Включаются настройкой FAST_SERIALIZERS.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import Recipe, RecipeIngredient, Tag
+from users.models import Subscription
+
+
+def image_url(name, request=None):
+    if not name:
+        return None
+    url = Recipe._meta.get_field('image').storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def author_representation(user):
+    return {
+        'username': user.username,
+        'email': user.email,
+        'id': user.id,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_subscribed': False,
+    }
+
+
+RECIPE_FIELDS = (
+    'id', 'tags', 'author', 'ingredients', 'is_favorited',
+    'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+)
+
+
+def recipe_representations(recipes, request=None, fields=RECIPE_FIELDS):
+    """Пользовательски-независимое представление рецептов (как в кеше)."""
+    recipe_ids = [recipe.pk for recipe in recipes]
+    tags = defaultdict(list)
+    if 'tags' in fields:
+        for row in Tag.objects.filter(
+            recipe__id__in=recipe_ids
+        ).values_list('recipe__id', 'id', 'name', 'color', 'slug'):
+            tags[row[0]].append({
+                'id': row[1], 'name': row[2], 'color': row[3], 'slug': row[4]
+            })
+    ingredients = defaultdict(list)
+    if 'ingredients' in fields:
+        for row in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name', 'amount',
+            'ingredient__measurement_unit'
+        ):
+            ingredients[row[0]].append({
+                'id': row[1], 'name': row[2], 'amount': row[3],
+                'measurement_unit': row[4]
+            })
+    getters = {
+        'id': lambda recipe: recipe.id,
+        'tags': lambda recipe: tags[recipe.pk],
+        'author': lambda recipe: author_representation(recipe.author),
+        'ingredients': lambda recipe: ingredients[recipe.pk],
+        'is_favorited': lambda recipe: False,
+        'is_in_shopping_cart': lambda recipe: False,
+        'name': lambda recipe: recipe.name,
+        'image': lambda recipe: image_url(recipe.image.name, request),
+        'text': lambda recipe: recipe.text,
+        'cooking_time': lambda recipe: recipe.cooking_time,
+    }
+    getters = [(name, getters[name]) for name in fields]
+    return [
+        {name: getter(recipe) for name, getter in getters}
+        for recipe in recipes
+    ]
+
+
+SUBSCRIPTION_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'is_subscribed',
+    'recipes', 'recipes_count',
+)
+
+
+def subscription_representations(subscriptions, request,
+                                 fields=SUBSCRIPTION_FIELDS):
+    author_ids = [subscription.user_id for subscription in subscriptions]
+    author_recipes = defaultdict(list)
+    if 'recipes' in fields:
+        recipes = Recipe.objects.filter(author_id__in=author_ids)
+        limit = request.query_params.get('recipes_limit')
+        if limit:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=F('pub_date').desc(),
+                )
+            ).filter(row_number__lte=int(limit))
+        for row in recipes.values_list(
+            'author_id', 'id', 'name', 'image', 'cooking_time'
+        ):
+            author_recipes[row[0]].append({
+                'id': row[1], 'name': row[2], 'image': image_url(row[3]),
+                'cooking_time': row[4]
+            })
+    counts = {}
+    if 'recipes_count' in fields:
+        counts = dict(
+            Recipe.objects.filter(author_id__in=author_ids).order_by().values(
+                'author_id'
+            ).annotate(count=Count('id')).values_list('author_id', 'count')
+        )
+    subscribed = set()
+    if 'is_subscribed' in fields:
+        subscribed = set(Subscription.objects.filter(
+            subscriber=request.user, user_id__in=author_ids
+        ).values_list('user_id', flat=True))
+    getters = {
+        'id': lambda subscription: subscription.id,
+        'username': lambda subscription: subscription.user.username,
+        'email': lambda subscription: subscription.user.email,
+        'first_name': lambda subscription: subscription.user.first_name,
+        'last_name': lambda subscription: subscription.user.last_name,
+        'is_subscribed':
+            lambda subscription: subscription.user_id in subscribed,
+        'recipes': lambda subscription: author_recipes[subscription.user_id],
+        'recipes_count':
+            lambda subscription: counts.get(subscription.user_id, 0),
+    }
+    getters = [(name, getters[name]) for name in fields]
+    return [
+        {name: getter(subscription) for name, getter in getters}
+        for subscription in subscriptions
+    ]
@@ -16,6 +16,10 @@ class RecipeFilter(filters.FilterSet):
         queryset=Tag.objects.all(),
         to_field_name='slug',
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'Популярные'),),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
@@ -24,6 +28,7 @@ class RecipeFilter(filters.FilterSet):
             'is_in_shopping_cart',
             'author',
             'tags',
+            'ordering',
         )
 
     def get_is_favorited(self, queryset, filter_name, filter_value):
@@ -37,6 +42,16 @@ class RecipeFilter(filters.FilterSet):
             return queryset.filter(is_in_shopping_cart=user)
         return queryset
 
+    def get_ordering(self, queryset, name, value):
+        if value == 'trending':
+            # Только рецепты с рейтингом: INNER JOIN с TrendingScore
+            # позволяет читать их по индексу на score от большего к
+            # меньшему, а LEFT JOIN со всеми рецептами требует сортировки.
+            return queryset.filter(trending__isnull=False).order_by(
+                '-trending__score', '-pub_date'
+            )
+        return queryset
+
 
 class IngredientFilter(filters.FilterSet):
 
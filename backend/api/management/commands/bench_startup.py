@@ -0,0 +1,72 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+PROBE = '''
+import json, time
+started = time.perf_counter()
+from foodgram.wsgi import application
+loaded = time.perf_counter()
+from django.test import Client
+response = Client(HTTP_HOST={host!r}).get({url!r})
+done = time.perf_counter()
+print(json.dumps({{
+    'load': loaded - started,
+    'first_request': done - loaded,
+    'status': response.status_code,
+}}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Замер загрузки WSGI-приложения и первого запроса '
+            'с прогревом и без')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--url', default='/api/recipes/')
+
+    def probe(self, url, warm_up):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*']
+        env = dict(
+            os.environ,
+            WARM_UP_ON_LOAD=str(warm_up),
+            DJANGO_SETTINGS_MODULE=os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'foodgram.settings'
+            ),
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(
+                host=hosts[0] if hosts else 'localhost', url=url
+            )],
+            env=env, capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout
+        return json.loads(output.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for warm_up in (False, True):
+            results = [
+                self.probe(options['url'], warm_up)
+                for _ in range(options['runs'])
+            ]
+            self.stdout.write(
+                '{}: загрузка {:.1f} мс, первый запрос {:.1f} мс, '
+                'сумма {:.1f} мс (медианы из {}, HTTP {})'.format(
+                    'с прогревом' if warm_up else 'без прогрева',
+                    statistics.median(r['load'] for r in results) * 1000,
+                    statistics.median(
+                        r['first_request'] for r in results
+                    ) * 1000,
+                    statistics.median(
+                        r['load'] + r['first_request'] for r in results
+                    ) * 1000,
+                    len(results),
+                    results[-1]['status'],
+                )
+            )
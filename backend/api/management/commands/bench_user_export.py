@@ -0,0 +1,38 @@
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.services import user_archive
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Замер скорости и памяти потоковой выгрузки данных пользователя'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user = User.objects.get(email=options['email'])
+        tracemalloc.start()
+        started = time.perf_counter()
+        first = None
+        size = parts = 0
+        for part in user_archive(user, chunk_size=options['chunk_size']):
+            if first is None:
+                first = time.perf_counter() - started
+            size += len(part)
+            parts += 1
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{size / 1024 / 1024:.1f} МБ за {elapsed:.2f} с '
+            f'({size / 1024 / 1024 / elapsed:.1f} МБ/с), {parts} кусков, '
+            f'первый байт через {(first or 0) * 1000:.0f} мс, '
+            f'пик памяти {peak / 1024 / 1024:.1f} МБ'
+        )
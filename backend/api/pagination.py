@@ -1,5 +1,56 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import (LimitOffsetPagination,
+                                       PageNumberPagination)
 
+from foodgram.paginators import EstimatedCountPaginator, approximate_count
 
-class LimitPageNumberPagination(PageNumberPagination):
+
+class EstimatedCountMixin:
+    """Помечает ответ заголовком X-Count-Estimated, если count оценочный."""
+
+    count_estimated = False
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response['X-Count-Estimated'] = str(self.count_estimated).lower()
+        return response
+
+
+class LimitPageNumberPagination(EstimatedCountMixin, PageNumberPagination):
     page_size_query_param = 'limit'
+    django_paginator_class = EstimatedCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = super().paginate_queryset(queryset, request, view)
+        if page is not None:
+            self.count_estimated = getattr(
+                self.page.paginator, 'count_estimated', False
+            )
+        return page
+
+
+class EstimatedLimitOffsetPagination(EstimatedCountMixin,
+                                     LimitOffsetPagination):
+
+    def get_count(self, queryset):
+        count, self.count_estimated = approximate_count(queryset)
+        if self.count_estimated and (
+            self.get_offset(self.request) + self.limit >= count
+        ):
+            # Хвост по оценке: точный COUNT(*), чтобы не потерять строки
+            # за заниженной оценкой и не отдать лишнюю ссылку next.
+            count, self.count_estimated = queryset.count(), False
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # get_count читает offset, а DRF сохраняет request только после.
+        self.request = request
+        rows = super().paginate_queryset(queryset, request, view)
+        if rows is not None and self.count_estimated and (
+            len(rows) < self.limit
+        ):
+            # Неполная страница: оценка завышена, конец списка уже виден.
+            self.count = self.offset + len(rows) if rows else (
+                queryset.count()
+            )
+            self.count_estimated = False
+        return rows
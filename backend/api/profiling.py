@@ -0,0 +1,170 @@
+"""Профилирование отдельных запросов и снимки памяти для staff.
+
+Включается настройкой PROFILING_ENABLED; без неё middleware снимается
+из цепочки при старте (MiddlewareNotUsed), а эндпоинты отвечают 404.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+from rest_framework import exceptions, permissions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+
+REPORT_ID = re.compile(r'[0-9a-f]{32}')
+
+_baseline = None
+
+
+def is_staff(request):
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def profile_report(profiler, request):
+    stream = io.StringIO()
+    stream.write(f'{request.method} {request.get_full_path()}\n\n')
+    pstats.Stats(profiler, stream=stream).sort_stats(
+        settings.PROFILING_SORT
+    ).print_stats(settings.PROFILING_LIMIT)
+    return stream.getvalue()
+
+
+def save_report(report):
+    """Пишет отчёт в PROFILING_DIR и возвращает его id.
+
+    Отчёты лежат на диске, а не в кеше процесса: забирать отчёт может
+    любой воркер. Заодно удаляются устаревшие отчёты.
+    """
+    directory = Path(settings.PROFILING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    deadline = time.time() - settings.PROFILING_REPORT_TIMEOUT
+    for path in directory.glob('*.txt'):
+        try:
+            if path.stat().st_mtime < deadline:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+    report_id = uuid.uuid4().hex
+    temporary = directory / f'{report_id}.tmp'
+    temporary.write_text(report, encoding='utf-8')
+    os.replace(temporary, directory / f'{report_id}.txt')
+    return report_id
+
+
+def load_report(report_id):
+    if not REPORT_ID.fullmatch(report_id):
+        return None
+    path = Path(settings.PROFILING_DIR) / f'{report_id}.txt'
+    try:
+        if path.stat().st_mtime < (
+            time.time() - settings.PROFILING_REPORT_TIMEOUT
+        ):
+            return None
+        return path.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return None
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос с заголовком X-Profile или ?profile=1.
+
+    Отчёт cProfile сохраняется в PROFILING_DIR, его id возвращается
+    в X-Profile-Id.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        if (settings.PROFILING_TRACEMALLOC_FRAMES
+                and not tracemalloc.is_tracing()):
+            tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (
+            request.META.get(PROFILE_HEADER)
+            or PROFILE_PARAM in request.GET
+        ) or not is_staff(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        report_id = save_report(profile_report(profiler, request))
+        response['X-Profile-Id'] = report_id
+        return response
+
+
+class ProfilingView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def initial(self, request, *args, **kwargs):
+        if not settings.PROFILING_ENABLED:
+            raise Http404
+        super().initial(request, *args, **kwargs)
+
+
+class ProfileReportView(ProfilingView):
+
+    def get(self, request, report_id):
+        report = load_report(report_id)
+        if report is None:
+            raise Http404('Отчёт не найден или устарел')
+        return HttpResponse(report, content_type='text/plain; charset=utf-8')
+
+
+class MemorySnapshotView(ProfilingView):
+    """GET — топ выделений памяти в этом процессе (и разница с базовым
+    снимком, если он есть), POST — запомнить текущий снимок как базовый.
+    """
+
+    def snapshot(self):
+        if not tracemalloc.is_tracing():
+            raise exceptions.ValidationError(
+                'tracemalloc выключен: задайте PROFILING_TRACEMALLOC_FRAMES'
+            )
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+    def get(self, request):
+        global _baseline
+        snapshot = self.snapshot()
+        limit = settings.PROFILING_LIMIT
+        current, peak = tracemalloc.get_traced_memory()
+        data = {
+            'current': current,
+            'peak': peak,
+            'top': [
+                str(stat) for stat in snapshot.statistics('lineno')[:limit]
+            ],
+        }
+        if _baseline is not None:
+            data['diff'] = [
+                str(stat) for stat
+                in snapshot.compare_to(_baseline, 'lineno')[:limit]
+            ]
+        return Response(data)
+
+    def post(self, request):
+        global _baseline
+        _baseline = self.snapshot()
+        return Response(status=204)
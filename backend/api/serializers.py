@@ -1,15 +1,26 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import models, transaction
 from djoser.serializers import (
     UserCreateSerializer as DjoserUserCreateSerializer
 )
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from drf_base64.fields import Base64ImageField
-from recipes.models import (Ingredient, Recipe, RecipeIngredient,
-                            Tag, Favorite, ShoppingCart)
+from jobs.models import Job
+from recipes.models import (Change, Ingredient, Recipe, RecipeIngredient,
+                            Tag)
+from recipes.changes import log_change
+from recipes.feed import fan_out
+from recipes.services import (lock_recipe_carts, release_image_on_commit,
+                              update_cart_totals)
+from recipes.similarity import store_sketches
 from rest_framework import serializers
 from users.models import Subscription
 
+from . import fast
+from .cache import (UserFlags, cache_representations,
+                    get_cached_representations)
+
 User = get_user_model()
 
 
@@ -50,7 +61,31 @@ class UserSerializer(DjoserUserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return Subscription.objects.filter(user=obj).exists()
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
+            return False
+        return Subscription.objects.filter(
+            subscriber=request.user,
+            user=obj
+        ).exists()
+
+
+class RecipeAuthorSerializer(UserSerializer):
+
+    def get_is_subscribed(self, obj):
+        # Подставляется для текущего пользователя в RecipeSerializer.
+        return False
+
+
+class SparseFieldsMixin:
+    """Оставляет только поля, запрошенные через context['fields']."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
 
 
 class RecipeSubscribeSerializer(serializers.ModelSerializer):
@@ -59,7 +94,20 @@ class RecipeSubscribeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        if not settings.FAST_SERIALIZERS:
+            return super().to_representation(data)
+        if isinstance(data, models.Manager):
+            data = data.all()
+        return fast.subscription_representations(
+            list(data), self.context['request'], tuple(self.child.fields)
+        )
+
+
+class SubscriptionSerializer(SparseFieldsMixin,
+                             serializers.ModelSerializer):
     username = serializers.CharField(
         source='user.username',
         read_only=True
@@ -82,6 +130,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Subscription
+        list_serializer_class = SubscriptionListSerializer
         fields = (
             'id',
             'username',
@@ -157,8 +206,38 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    author = UserSerializer(required=False, read_only=True)
+RECIPE_PREFETCH = {
+    'tags': 'tags',
+    'ingredients': 'recipe_ingredients__ingredient',
+}
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        recipes = list(data)
+        request = self.context.get('request')
+        fields = self.context.get('fields')
+        flags = UserFlags(getattr(request, 'user', None), recipes, fields)
+        cached = get_cached_representations(recipes, request, fields)
+        missing = [recipe for recipe in recipes if recipe.pk not in cached]
+        if missing:
+            rendered = list(zip(
+                missing, self.child.base_representations(missing)
+            ))
+            cache_representations(rendered, request, fields)
+            cached.update(
+                (recipe.pk, data) for recipe, data in rendered
+            )
+        return [
+            flags.apply(recipe, cached[recipe.pk]) for recipe in recipes
+        ]
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = RecipeAuthorSerializer(required=False, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     image = Base64ImageField()
     ingredients = serializers.SerializerMethodField()
@@ -167,6 +246,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializer
         fields = (
             'id',
             'tags',
@@ -181,7 +261,6 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_ingredients(self, obj):
-        recipe_ingredients = RecipeIngredient.objects.filter(recipe=obj)
         return [
             {
                 'id': recipe_ingredient.ingredient.id,
@@ -190,26 +269,41 @@ class RecipeSerializer(serializers.ModelSerializer):
                 'measurement_unit':
                     recipe_ingredient.ingredient.measurement_unit
             }
-            for recipe_ingredient in recipe_ingredients
+            for recipe_ingredient in obj.recipe_ingredients.all()
         ]
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(
-            recipe=obj,
-            user=request.user
-        ).exists()
+        # Флаги пользователя накладываются поверх кеша в UserFlags.apply.
+        return False
 
     def get_is_in_shopping_cart(self, obj):
+        return False
+
+    def base_representations(self, recipes):
+        if settings.FAST_SERIALIZERS:
+            return fast.recipe_representations(
+                recipes, self.context.get('request'), tuple(self.fields)
+            )
+        models.prefetch_related_objects(recipes, *(
+            lookup for name, lookup in RECIPE_PREFETCH.items()
+            if name in self.fields
+        ))
+        return [super(RecipeSerializer, self).to_representation(recipe)
+                for recipe in recipes]
+
+    def to_representation(self, instance):
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(
-            recipe=obj,
-            user=request.user
-        ).exists()
+        fields = self.context.get('fields')
+        data = get_cached_representations(
+            [instance], request, fields
+        ).get(instance.pk)
+        if data is None:
+            data, = self.base_representations([instance])
+            cache_representations([(instance, data)], request, fields)
+        flags = self.context.get('flags') or UserFlags(
+            getattr(request, 'user', None), [instance], fields
+        )
+        return flags.apply(instance, data)
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -310,12 +404,16 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         self.create_bulk_ing_tag(recipe, ingredients_data)
         recipe.tags.set(tags_data)
+        store_sketches([recipe.pk])
+        fan_out(recipe)
+        log_change(Change.RECIPE, Change.CREATED, recipe.pk)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', [])
         tags_data = validated_data.pop('tags', [])
+        old_image = instance.image.name
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
@@ -326,12 +424,33 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if tags_data:
             instance.tags.set(tags_data)
         if ingredients_data:
+            lock_recipe_carts(instance.pk)
+            update_cart_totals([instance.pk], -1)
             RecipeIngredient.objects.filter(recipe=instance).delete()
             self.create_bulk_ing_tag(instance, ingredients_data)
+            update_cart_totals([instance.pk], 1)
         instance.save()
+        if tags_data or ingredients_data:
+            store_sketches([instance.pk])
+        if instance.image.name != old_image:
+            release_image_on_commit(old_image)
+        log_change(Change.RECIPE, Change.UPDATED, instance.pk)
         return instance
 
     def to_representation(self, instance):
         return RecipeSerializer(instance, context={
             'request': self.context.get('request')
         }).data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = (
+            'id',
+            'name',
+            'status',
+            'attempts',
+            'created_at',
+            'finished_at',
+        )
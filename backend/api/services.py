@@ -1,16 +1,32 @@
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from django.http import FileResponse
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Sum
+from django.http import FileResponse, Http404, HttpResponse
 from io import BytesIO
-from recipes.models import RecipeIngredient
+from recipes.exports import recipe_document
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Subscription
 
 
-def create_pdf(user):
-    data_list = RecipeIngredient.objects.filter(recipe__author=user).values(
-        'ingredient__name', 'ingredient__measurement_unit', 'amount'
-    )
+def render_shopping_cart_pdf(user):
+    # reportlab тяжёлый, импортируем только при выгрузке.
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    data_list = RecipeIngredient.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(amount=Sum('amount')).order_by('ingredient__name')
     buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
+    p = canvas.Canvas(buffer, pagesize=letter, invariant=True)
     p.drawString(100, 750, "Shopping Cart Ingredients:")
 
     y = 730
@@ -18,13 +34,166 @@ def create_pdf(user):
         ingredient_name = recipe_ingredient['ingredient__name']
         measurement_unit = recipe_ingredient['ingredient__measurement_unit']
         amount = recipe_ingredient['amount']
+        if y < 50:
+            p.showPage()
+            y = 750
         p.drawString(100, y, f"{ingredient_name}: {amount} {measurement_unit}")
         y -= 20
 
     p.save()
-    buffer.seek(0)
-    return FileResponse(
-        buffer,
-        as_attachment=True,
-        filename='shopping_cart.pdf'
+    return buffer.getvalue()
+
+
+def store_export(content, suffix):
+    """Кладёт файл в MEDIA_ROOT/EXPORTS_DIR под именем из его хеша.
+
+    Возвращает путь относительно MEDIA_ROOT; одинаковые выгрузки
+    пишутся на диск один раз.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    name = f'{settings.EXPORTS_DIR}/{digest[:2]}/{digest}{suffix}'
+    path = Path(settings.MEDIA_ROOT) / name
+    if path.exists():
+        path.touch()
+        return name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+        tmp.write(content)
+    os.chmod(tmp.name, 0o644)
+    os.replace(tmp.name, path)
+    return name
+
+
+def export_response(name, filename):
+    path = Path(settings.MEDIA_ROOT) / name
+    if not path.is_file():
+        raise Http404('Файл устарел')
+    if not settings.USE_X_ACCEL_REDIRECT:
+        return FileResponse(
+            path.open('rb'),
+            as_attachment=True,
+            filename=filename
+        )
+    content_type, _ = mimetypes.guess_type(filename)
+    response = HttpResponse(
+        content_type=content_type or 'application/octet-stream'
     )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Redirect'] = (
+        settings.X_ACCEL_REDIRECT_LOCATION
+        + name[len(settings.EXPORTS_DIR) + 1:]
+    )
+    return response
+
+
+def create_pdf(user):
+    name = store_export(render_shopping_cart_pdf(user), '.pdf')
+    return export_response(name, 'shopping_cart.pdf')
+
+
+def export_shopping_cart(job):
+    job.result.name = store_export(
+        render_shopping_cart_pdf(job.user), '.pdf'
+    )
+
+
+class ChunkBuffer:
+    """Поток только для записи: zipfile пишет в него, генератор забирает
+    накопленное. Без seek/tell zipfile пишет записи с data descriptor.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def json_array(items):
+    yield '['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(item, ensure_ascii=False)
+    yield ']'
+
+
+def user_archive(user, chunk_size=500, block_size=1024 * 1024):
+    """ZIP с данными пользователя, отдаваемый кусками по мере сборки.
+
+    В памяти держится не больше одной пачки рецептов и одного блока файла.
+    """
+    buffer = ChunkBuffer()
+    archive = zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED)
+    recipes = Recipe.objects.filter(author=user).order_by('pk')
+    documents = {
+        'profile.json': [{
+            'id': user.id,
+            'email': user.email,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'date_joined': user.date_joined.isoformat(),
+        }],
+        'recipes.json': (
+            recipe_document(recipe)
+            for recipe in recipes.select_related('author').prefetch_related(
+                'tags', 'recipe_ingredients__ingredient'
+            ).iterator(chunk_size=chunk_size)
+        ),
+        'favorites.json': (
+            {'recipe': recipe_id, 'name': name,
+             'created_at': created_at.isoformat()}
+            for recipe_id, name, created_at in Favorite.objects.filter(
+                user=user
+            ).order_by('pk').values_list(
+                'recipe_id', 'recipe__name', 'created_at'
+            ).iterator(chunk_size=chunk_size)
+        ),
+        'shopping_cart.json': (
+            {'recipe': recipe_id, 'name': name,
+             'created_at': created_at.isoformat()}
+            for recipe_id, name, created_at in ShoppingCart.objects.filter(
+                user=user
+            ).order_by('pk').values_list(
+                'recipe_id', 'recipe__name', 'created_at'
+            ).iterator(chunk_size=chunk_size)
+        ),
+        'subscriptions.json': (
+            {'id': author_id, 'username': username}
+            for author_id, username in Subscription.objects.filter(
+                subscriber=user
+            ).order_by('pk').values_list(
+                'user_id', 'user__username'
+            ).iterator(chunk_size=chunk_size)
+        ),
+    }
+    for name, items in documents.items():
+        with archive.open(name, 'w') as entry:
+            for part in json_array(items):
+                entry.write(part.encode())
+                if buffer.chunks:
+                    yield buffer.take()
+    storage = Recipe._meta.get_field('image').storage
+    images = set(recipes.exclude(image='').values_list('image', flat=True))
+    for image in sorted(images):
+        if not storage.exists(image):
+            continue
+        info = zipfile.ZipInfo(f'images/{image}')
+        info.compress_type = zipfile.ZIP_STORED
+        with storage.open(image, 'rb') as source, archive.open(
+            info, 'w', force_zip64=True
+        ) as entry:
+            while block := source.read(block_size):
+                entry.write(block)
+                if buffer.chunks:
+                    yield buffer.take()
+    archive.close()
+    yield buffer.take()
@@ -0,0 +1,202 @@
+"""GET /api/events/ — server-sent events для текущего пользователя.
+
+Обслуживается напрямую из foodgram/asgi.py, минуя обработчик Django:
+соединение висит долго и должно закрываться, как только уходит клиент.
+Токен передаётся заголовком Authorization. EventSource не умеет ставить
+заголовки, поэтому вместо токена в URL идёт ?ticket= — подписанный
+билет из POST /api/events/ticket/, живущий EVENTS_TICKET_MAX_AGE секунд:
+постоянный токен не попадает в логи и историю браузера. Билет нужен
+только для открытия соединения; после обрыва клиент берёт новый. id
+события — id записи журнала изменений, по Last-Event-ID пропущенное
+досылается из журнала.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signing import BadSignature, TimestampSigner
+from django.db import close_old_connections
+from recipes import events
+from recipes.changes import USER_KINDS
+from recipes.models import Change
+from rest_framework.authtoken.models import Token
+
+PATH = '/api/events/'
+TICKET_SALT = 'api.sse.ticket'
+
+User = get_user_model()
+
+
+def make_ticket(user):
+    return TimestampSigner(salt=TICKET_SALT).sign(str(user.pk))
+
+
+def ticket_user_id(ticket):
+    try:
+        return int(TimestampSigner(salt=TICKET_SALT).unsign(
+            ticket, max_age=settings.EVENTS_TICKET_MAX_AGE
+        ))
+    except (BadSignature, ValueError):
+        return None
+
+
+def database_sync_to_async(func):
+    def wrapper(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+@database_sync_to_async
+def get_user(key, ticket):
+    if key:
+        token = Token.objects.select_related('user').filter(key=key).first()
+        user = token and token.user
+    else:
+        user_id = ticket_user_id(ticket)
+        user = user_id and User.objects.filter(pk=user_id).first()
+    if not user or not user.is_active:
+        return None
+    return user
+
+
+@database_sync_to_async
+def missed_events(user, last_id):
+    changes = list(Change.objects.filter(
+        user=user, kind__in=USER_KINDS, id__gt=last_id
+    ).order_by('id')[:settings.EVENTS_REPLAY_LIMIT + 1])
+    if len(changes) > settings.EVENTS_REPLAY_LIMIT:
+        return [events.RESET]
+    return [events.change_event(change) for change in changes]
+
+
+start_events = sync_to_async(events.start)
+
+
+def credentials(scope):
+    headers = dict(scope['headers'])
+    query = parse_qs(scope['query_string'].decode())
+    key = None
+    scheme, _, value = headers.get(b'authorization', b'').decode().partition(
+        ' '
+    )
+    if scheme.lower() == 'token' and value:
+        key = value.strip()
+    ticket = query.get('ticket', [None])[0]
+    last_id = (
+        headers.get(b'last-event-id', b'').decode()
+        or query.get('lastEventId', [''])[0]
+    )
+    return key, ticket, int(last_id) if last_id.isdigit() else None
+
+
+def encode(event):
+    if event is events.RESET:
+        return b'event: reset\ndata: {}\n\n'
+    data = json.dumps({'action': event['action'], 'id': event['object_id']})
+    return (
+        f'id: {event["id"]}\nevent: {event["kind"]}\ndata: {data}\n\n'
+    ).encode()
+
+
+async def send_json(send, status, detail):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'detail': detail}, ensure_ascii=False).encode(),
+    })
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(send, queue, replayed):
+    while True:
+        try:
+            event = await asyncio.wait_for(
+                queue.get(), settings.EVENTS_HEARTBEAT
+            )
+        except asyncio.TimeoutError:
+            await send({
+                'type': 'http.response.body', 'body': b': ping\n\n',
+                'more_body': True,
+            })
+            continue
+        if event.get('id') in replayed:
+            continue
+        await send({
+            'type': 'http.response.body', 'body': encode(event),
+            'more_body': True,
+        })
+
+
+async def events_view(scope, receive, send):
+    if scope['method'] != 'GET':
+        return await send_json(
+            send, 405, f'Метод "{scope["method"]}" не разрешен.'
+        )
+    key, ticket, last_id = credentials(scope)
+    user = await get_user(key, ticket) if key or ticket else None
+    if user is None:
+        return await send_json(
+            send, 401, 'Учетные данные не были предоставлены.'
+        )
+    await start_events()
+    listener = events.hub.subscribe(user.pk)
+    try:
+        # Подписка до чтения журнала: событие не потеряется между ними,
+        # а повтор уже отправленного отсекается по id.
+        missed = await missed_events(user, last_id) if last_id else []
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'retry: 3000\n\n' + b''.join(map(encode, missed)),
+            'more_body': True,
+        })
+        replayed = {event['id'] for event in missed if 'id' in event}
+        tasks = [
+            asyncio.ensure_future(stream(send, listener[1], replayed)),
+            asyncio.ensure_future(wait_disconnect(receive)),
+        ]
+        try:
+            done, _ = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for task in tasks:
+                task.cancel()
+        for task in done:
+            task.result()
+    finally:
+        events.hub.unsubscribe(user.pk, listener)
+
+
+def with_events(application):
+    """Оборачивает ASGI-приложение Django, забирая себе PATH."""
+
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == PATH:
+            return await events_view(scope, receive, send)
+        return await application(scope, receive, send)
+
+    return router
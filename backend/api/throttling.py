@@ -0,0 +1,84 @@
+"""Ограничение частоты запросов по алгоритму token bucket.
+
+Общее ведро живёт в кеше settings.THROTTLE['cache'] и описывается двумя
+ключами: моментом создания t0 и счётчиком израсходованных токенов
+(в тысячных долях, чтобы обходиться целочисленным cache.incr). К моменту t
+доступно rate * (t - t0) + capacity токенов; если счётчик отстал от
+rate * (t - t0), его подтягивают, чтобы простой не копил больше capacity.
+
+Воркер забирает токены из общего ведра пачками (lease) и тратит их
+локально, поэтому большинство запросов проверяется обращением к словарю
+без похода в кеш. Словарь ограничен THROTTLE['leases'] ключами: давно
+не приходившие клиенты вытесняются вместе с остатком своей пачки.
+"""
+import math
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+SCALE = 1000
+
+_leases = OrderedDict()
+
+
+def keep_lease(key, left):
+    if left:
+        _leases[key] = left
+        if len(_leases) > settings.THROTTLE['leases']:
+            _leases.popitem(last=False)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Стоимость запроса берётся из view.throttle_costs[view.action]."""
+
+    def get_key(self, request):
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}', settings.THROTTLE['user']
+        return f'anon:{self.get_ident(request)}', settings.THROTTLE['anon']
+
+    def allow_request(self, request, view):
+        cost = getattr(view, 'throttle_costs', {}).get(
+            getattr(view, 'action', None), 1
+        )
+        key, (rate, capacity) = self.get_key(request)
+        left = _leases.pop(key, 0)
+        if left >= cost:
+            keep_lease(key, left - cost)
+            return True
+        lease = max(cost, settings.THROTTLE['lease']) - left
+        granted, self.retry_after = self.take(key, lease, rate, capacity)
+        if not granted and lease > cost - left:
+            # На целую пачку не хватило — берём ровно недостающее.
+            lease = cost - left
+            granted, self.retry_after = self.take(key, lease, rate, capacity)
+        if not granted:
+            keep_lease(key, left)
+            return False
+        keep_lease(key, left + lease - cost)
+        return True
+
+    def take(self, key, amount, rate, capacity):
+        """Забирает amount токенов из общего ведра: (успех, ожидание)."""
+        cache = caches[settings.THROTTLE['cache']]
+        now = time.time()
+        origin_key = f'throttle:{key}:origin'
+        cache.add(origin_key, now, settings.THROTTLE['timeout'])
+        origin = cache.get(origin_key, now)
+        counter_key = f'throttle:{key}:{origin}'
+        cache.add(counter_key, 0, settings.THROTTLE['timeout'])
+        refilled = int(rate * (now - origin) * SCALE)
+        cost = int(amount * SCALE)
+        consumed = cache.incr(counter_key, cost)
+        if consumed - cost < refilled:
+            consumed = cache.incr(counter_key, refilled - consumed + cost)
+        available = refilled + capacity * SCALE
+        if consumed <= available:
+            return True, None
+        cache.decr(counter_key, cost)
+        return False, math.ceil((consumed - available) / SCALE / rate)
+
+    def wait(self):
+        return getattr(self, 'retry_after', None)
@@ -1,8 +1,10 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (IngredientViewSet, RecipeViewSet, SubscriptionViewSet,
-                    TagViewSet, UserActionViewSet)
+from .profiling import MemorySnapshotView, ProfileReportView
+from .views import (BatchView, ChangesView, EventTicketView,
+                    IngredientViewSet, JobViewSet, RecipeViewSet,
+                    SubscriptionViewSet, TagViewSet, UserActionViewSet)
 
 
 router = DefaultRouter()
@@ -10,6 +12,7 @@ router = DefaultRouter()
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
+router.register('jobs', JobViewSet, basename='jobs')
 router.register(r'users/subscriptions', SubscriptionViewSet,
                 basename='subscriptions')
 router.register('users', UserActionViewSet, basename='users')
@@ -17,6 +20,13 @@ router.register('users', UserActionViewSet, basename='users')
 app_name = 'api'
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('changes/', ChangesView.as_view(), name='changes'),
+    path('events/ticket/', EventTicketView.as_view(), name='events-ticket'),
+    path('debug/profiles/<str:report_id>/', ProfileReportView.as_view(),
+         name='profile-report'),
+    path('debug/memory/', MemorySnapshotView.as_view(),
+         name='memory-snapshot'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,9 +1,26 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import (Http404, HttpRequest, QueryDict,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
+from django.urls import Resolver404, resolve, reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django_filters import rest_framework as filters
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, Recipe,
-                            ShoppingCart, Tag)
+from jobs.models import Job
+from jobs.services import enqueue
+from recipes.changes import changes_since, log_change
+from recipes.feed import (decode_cursor, encode_cursor, feed_page, follow,
+                          unfollow)
+from recipes.models import (CartIngredientTotal, Change, Favorite,
+                            Ingredient, Recipe, ShoppingCart, Tag)
+from recipes.services import (insert_ignore, release_image_on_commit,
+                              update_cart_totals)
+from recipes.similarity import similar_recipe_ids
+from recipes.trending import withdraw
 from rest_framework import (
     exceptions,
     mixins,
@@ -17,48 +34,183 @@ from rest_framework.decorators import action
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
 from users.models import Subscription
 
+from .cache import (UserFlags, last_modified, make_etag, recipe_cache_key,
+                    recipe_versions)
 from .filters import IngredientFilter, RecipeFilter
 from .pagination import LimitPageNumberPagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (IngredientSerializer, RecipeCreateSerializer,
+from .serializers import (IngredientSerializer, JobSerializer,
+                          RecipeCreateSerializer, RecipeSerializer,
                           RecipeSubscribeSerializer, SubscriptionSerializer,
                           TagSerializer)
-from .services import create_pdf
+from .services import create_pdf, export_response, user_archive
+from .sse import make_ticket
 
 User = get_user_model()
 
+RECIPE_CARD_FIELDS = ('id', 'name', 'image', 'cooking_time', 'tags', 'author')
+SUBSCRIPTION_CARD_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'recipes', 'recipes_count'
+)
+CHANGE_KINDS = {
+    Favorite: Change.FAVORITE,
+    ShoppingCart: Change.SHOPPING_CART,
+}
+RECIPE_COLUMNS = {
+    'name': ('name',),
+    'image': ('image',),
+    'text': ('text',),
+    'cooking_time': ('cooking_time',),
+    'author': ('author__username', 'author__email', 'author__first_name',
+               'author__last_name'),
+}
+SUBSCRIPTION_COLUMNS = {
+    'username': ('user__username',),
+    'email': ('user__email',),
+    'first_name': ('user__first_name',),
+    'last_name': ('user__last_name',),
+}
+
+
+def query_int(request, name, default, min_value, max_value):
+    """Целый параметр запроса, приведённый к [min_value, max_value].
+
+    Не число — 400 с ошибкой по имени параметра.
+    """
+    try:
+        value = serializers.IntegerField().run_validation(
+            request.query_params.get(name, default)
+        )
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({name: error.detail})
+    return max(min_value, min(value, max_value))
+
+
+class SparseFieldsetMixin:
+    """Параметры ?fields=a,b и ?view=card для чтения списков и объектов."""
+
+    card_fields = ()
+
+    def get_requested_fields(self):
+        if self.request.method not in permissions.SAFE_METHODS:
+            return None
+        params = self.request.query_params
+        if params.get('view') == 'card':
+            requested = self.card_fields
+        elif params.get('fields'):
+            requested = params['fields'].split(',')
+        else:
+            return None
+        return tuple(
+            name for name in self.get_serializer_class().Meta.fields
+            if name in requested
+        ) or None
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+
+
+class ConditionalRetrieveMixin:
+    """ETag и Last-Modified для retrieve; при совпадении с If-None-Match
+    или If-Modified-Since отдаёт 304, не запуская сериализатор.
+    """
+
+    def get_validators(self, instance):
+        """Возвращает (etag, last_modified, контекст сериализатора).
+
+        По умолчанию ответ зависит только от updated_at объекта.
+        """
+        updated_at = instance.updated_at
+        etag = make_etag(instance._meta.label, instance.pk, updated_at)
+        return etag, updated_at, {}
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified, context = self.get_validators(instance)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            serializer = self.get_serializer(instance)
+            serializer.context.update(context)
+            response = Response(serializer.data)
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class UserActionViewSet(ConditionalRetrieveMixin, UserViewSet):
+    throttle_costs = {'export': 20}
+
+    def get_validators(self, instance):
+        user = self.request.user
+        subscribed = user.is_authenticated and Subscription.objects.filter(
+            subscriber=user, user=instance
+        ).exists()
+        etag = make_etag('user', instance.pk, instance.updated_at, subscribed)
+        return etag, None if user.is_authenticated else instance.updated_at, {}
 
-class UserActionViewSet(UserViewSet):
     @action(["get", "put", "patch", "delete"],
             detail=False,
             permission_classes=(IsAuthenticated,))
     def me(self, request, *args, **kwargs):
         return super().me(request, *args, **kwargs)
 
+    @action(["get"],
+            detail=False,
+            url_path='me/export',
+            permission_classes=(IsAuthenticated,))
+    def export(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(
+            user_archive(request.user), content_type='application/zip'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="foodgram_data.zip"'
+        )
+        return response
+
+    def get_author_pk(self):
+        try:
+            return int(self.kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+
     @action(['POST'],
             detail=True, serializer_class=SubscriptionSerializer)
+    @transaction.atomic
     def subscribe(self, request, *args, **kwargs):
-        user_obj = self.get_object()
+        pk = self.get_author_pk()
 
         if request.method == 'POST':
-            if request.user == user_obj:
+            if request.user.pk == pk:
                 return Response(
                     "Нельзя подписываться на самого себя",
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            subscription, created = Subscription.objects.get_or_create(
-                user=user_obj,
-                subscriber=request.user
+            created = insert_ignore(
+                Subscription, 'user', pk, subscriber=request.user.pk
             )
 
-            if not created:
+            if created is None:
+                get_object_or_404(User.objects.only('id'), pk=pk)
                 return Response(
                     'Вы уже подписаны!',
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            subscription = Subscription.objects.select_related('user').get(
+                pk=created
+            )
+            follow(request.user, subscription.user)
+            log_change(Change.SUBSCRIPTION, Change.ADDED, pk, request.user)
 
             serializer = SubscriptionSerializer(
                 subscription,
@@ -67,16 +219,20 @@ class UserActionViewSet(UserViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
+    @transaction.atomic
     def delete_subscribe(self, request, *args, **kwargs):
-        user_obj = self.get_object()
+        pk = self.get_author_pk()
         del_count, _ = Subscription.objects.filter(
-            user=user_obj,
+            user_id=pk,
             subscriber=request.user
         ).delete()
         if not del_count:
+            get_object_or_404(User.objects.only('id'), pk=pk)
             raise serializers.ValidationError(
                 'Вы не были подписаны на данного автора.'
             )
+        unfollow(request.user, pk)
+        log_change(Change.SUBSCRIPTION, Change.REMOVED, pk, request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -85,6 +241,8 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
+    # Список без пагинации: может отдать весь справочник.
+    throttle_costs = {'list': 5}
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
@@ -95,59 +253,128 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalRetrieveMixin, SparseFieldsetMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly, ]
     serializer_class = RecipeCreateSerializer
     pagination_class = LimitPageNumberPagination
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    card_fields = RECIPE_CARD_FIELDS
+    throttle_costs = {
+        'create': 10,
+        'update': 10,
+        'partial_update': 10,
+        'download_shopping_cart': 20,
+        'shopping_cart_export': 10,
+        'similar': 3,
+        'feed': 2,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset.select_related('author')
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        return queryset.only('id', 'author', 'updated_at', *(
+            column for name in fields
+            for column in RECIPE_COLUMNS.get(name, ())
+        ))
+
+    def get_validators(self, recipe):
+        user = self.request.user
+        fields = self.get_requested_fields()
+        flags = UserFlags(user, [recipe], fields)
+        # Те же входные данные, что у ключа кеша тела ответа.
+        version = recipe_versions([recipe], fields)[recipe.pk]
+        etag = make_etag(
+            recipe_cache_key(recipe.pk, version, self.request, fields),
+            recipe.pk in flags.favorited,
+            recipe.pk in flags.in_shopping_cart,
+            recipe.author_id in flags.subscribed,
+        )
+        # Флаги пользователя не отражены в датах, поэтому Last-Modified
+        # отдаём только анонимным.
+        modified = None if user.is_authenticated else last_modified(version)
+        return etag, modified, {'flags': flags}
+
+    def get_serializer_class(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return RecipeSerializer
+        return super().get_serializer_class()
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    def get_obj_or_404(self):
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        image, pk = instance.image.name, instance.pk
+        update_cart_totals([pk], -1)
+        instance.delete()
+        release_image_on_commit(image)
+        log_change(Change.RECIPE, Change.DELETED, pk)
+
+    def get_pk(self):
         try:
-            recipe = self.get_object()
-            return recipe
-        except Exception:
+            return int(self.kwargs['pk'])
+        except ValueError:
             raise exceptions.ValidationError(detail='Рецепта нет')
 
     def create_obj(self, request, obj_class):
-        recipe = self.get_obj_or_404()
-        obj, created = obj_class.objects.get_or_create(
-            user=request.user,
-            recipe=recipe
+        pk = self.get_pk()
+        created = insert_ignore(
+            obj_class, 'recipe', pk,
+            user=request.user.pk, created_at=timezone.now()
         )
-        if created:
-            serializer = RecipeSubscribeSerializer(recipe)
+        if created is None:
+            if not Recipe.objects.filter(pk=pk).exists():
+                raise exceptions.ValidationError(detail='Рецепта нет')
             return Response(
-                serializer.data,
-                status=status.HTTP_201_CREATED
+                'Ошибка создания',
+                status=status.HTTP_400_BAD_REQUEST
             )
+        if obj_class is ShoppingCart:
+            update_cart_totals([pk], 1, request.user.pk)
+        log_change(CHANGE_KINDS[obj_class], Change.ADDED, pk, request.user)
+        serializer = RecipeSubscribeSerializer(Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time'
+        ).get(pk=pk))
         return Response(
-            'Ошибка создания',
-            status=status.HTTP_400_BAD_REQUEST
+            serializer.data,
+            status=status.HTTP_201_CREATED
         )
 
     def delete_obj(self, request, obj_class):
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=self.kwargs.get('pk'))
-        _, deleted_count = obj_class.objects.filter(
-            user=user,
-            recipe=recipe
-        ).delete()
+        pk = self.get_pk()
+        queryset = obj_class.objects.filter(user=user, recipe_id=pk)
+        if obj_class is ShoppingCart:
+            # Удаляется только заблокированная строка, ингредиенты которой
+            # уже вычтены из итогов: параллельные запросы их не собьют.
+            locked = list(
+                queryset.select_for_update().values_list('pk', flat=True)
+            )
+            if locked:
+                update_cart_totals([pk], -1, user.pk)
+            queryset = obj_class.objects.filter(pk__in=locked)
+        withdraw(queryset)
+        deleted_count, _ = queryset.delete()
         if deleted_count:
+            log_change(CHANGE_KINDS[obj_class], Change.REMOVED, pk, user)
             return Response(status=status.HTTP_204_NO_CONTENT)
-        else:
-            return Response(
-                "Рецепта нет в избранных",
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        return Response(
+            "Рецепта нет в избранных",
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
     @action(methods=['POST', 'DELETE'],
             permission_classes=(permissions.IsAuthenticated,),
             detail=True)
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
         if request.method == 'POST':
             return self.create_obj(request, ShoppingCart)
@@ -158,31 +385,118 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=(permissions.IsAuthenticated,),
             detail=False)
     def download_shopping_cart(self, request, *args, **kwargs):
+        """Устарело: PDF рисуется прямо в запросе. Оставлено для текущего
+        фронтенда; новым клиентам — POST shopping_cart_export (очередь).
+        """
         file = create_pdf(request.user)
+        file['Deprecation'] = 'true'
+        file['Link'] = (
+            f'<{reverse("api:recipes-shopping-cart-export")}>; '
+            'rel="successor-version"'
+        )
         return file
 
+    @action(["get"],
+            permission_classes=(permissions.IsAuthenticated,),
+            detail=False)
+    def shopping_cart_totals(self, request, *args, **kwargs):
+        totals = CartIngredientTotal.objects.filter(
+            user=request.user
+        ).order_by('ingredient__name').values_list(
+            'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'total'
+        )
+        return Response([
+            {'id': pk, 'name': name, 'measurement_unit': unit,
+             'amount': total}
+            for pk, name, unit, total in totals
+        ])
+
+    @action(["post"],
+            permission_classes=(permissions.IsAuthenticated,),
+            detail=False)
+    def shopping_cart_export(self, request, *args, **kwargs):
+        job = enqueue('shopping_cart_pdf', user=request.user)
+        return Response(
+            JobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED
+        )
+
     @action(methods=['POST'],
             permission_classes=(permissions.IsAuthenticated,),
             detail=True)
+    @transaction.atomic
     def favorite(self, request, pk=None):
         return self.create_obj(request, Favorite)
 
     @favorite.mapping.delete
+    @transaction.atomic
     def delete_favorite(self, request, pk=None):
         return self.delete_obj(request, Favorite)
 
+    @action(["get"],
+            permission_classes=(permissions.IsAuthenticated,),
+            detail=False)
+    def feed(self, request, *args, **kwargs):
+        limit = query_int(request, 'limit', 20, 1, 100)
+        after = None
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            after = decode_cursor(cursor)
+            if after is None:
+                raise exceptions.ValidationError(detail='Неверный курсор')
+        page = feed_page(request.user, limit, after)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for _, recipe_id in page]
+        )
+        serializer = self.get_serializer(
+            [recipes[pk] for _, pk in page if pk in recipes], many=True
+        )
+        next_url = None
+        if len(page) == limit:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor',
+                encode_cursor(*page[-1])
+            )
+        return Response({'next': next_url, 'results': serializer.data})
 
-class SubscriptionViewSet(mixins.ListModelMixin,
+    @action(["get"], detail=True)
+    def similar(self, request, pk=None):
+        recipe = self.get_object()
+        limit = query_int(request, 'limit', 10, 1, 50)
+        ranked = [
+            recipe_id for recipe_id, _ in similar_recipe_ids(recipe.pk, limit)
+        ]
+        recipes = self.get_queryset().in_bulk(ranked)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ranked if pk in recipes], many=True
+        )
+        return Response(serializer.data)
+
+
+class SubscriptionViewSet(SparseFieldsetMixin,
+                          mixins.ListModelMixin,
                           mixins.CreateModelMixin,
                           generics.DestroyAPIView,
                           viewsets.GenericViewSet):
     serializer_class = SubscriptionSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    card_fields = SUBSCRIPTION_CARD_FIELDS
 
     def get_queryset(self):
         user = self.request.user
-        return Subscription.objects.filter(subscriber=user)
+        queryset = Subscription.objects.filter(
+            subscriber=user
+        ).select_related('user')
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+        return queryset.only('id', 'user', *(
+            column for name in fields
+            for column in SUBSCRIPTION_COLUMNS.get(name, ())
+        ))
 
+    @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         user = get_object_or_404(User, username=self.request.user.username)
         id_user_to_unfollow = self.kwargs.get('pk')
@@ -194,4 +508,107 @@ class SubscriptionViewSet(mixins.ListModelMixin,
             raise serializers.ValidationError(
                 'Вы не были подписаны на данного автора.'
             )
+        unfollow(user, user_to_unfollow)
+        log_change(Change.SUBSCRIPTION, Change.REMOVED, user_to_unfollow.pk,
+                   user)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JobViewSet(mixins.RetrieveModelMixin,
+                 mixins.ListModelMixin,
+                 viewsets.GenericViewSet):
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    @action(["get"], detail=True)
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != Job.DONE or not job.result:
+            return Response(
+                'Файл ещё не готов',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return export_response(job.result.name, 'shopping_cart.pdf')
+
+
+class BatchView(APIView):
+    """Несколько GET-запросов к API за один вызов.
+
+    Тело: {"requests": ["/api/recipes/1/", "/api/users/me/", ...]}.
+    Подзапросы выполняются в этом же процессе без middleware,
+    с пользователем основного запроса.
+    """
+
+    # Права проверяет каждый подзапрос.
+    permission_classes = (permissions.AllowAny,)
+
+    def sub_request(self, request, url):
+        path, _, query = url.partition('?')
+        sub = HttpRequest()
+        sub.method = 'GET'
+        sub.path = sub.path_info = path
+        sub.META = {
+            **request.META,
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+        }
+        sub.GET = QueryDict(query)
+        if request.user.is_authenticated:
+            sub._force_auth_user = request.user
+            sub._force_auth_token = request.auth
+        return sub
+
+    def run(self, request, url):
+        if not isinstance(url, str) or not url.startswith('/api/'):
+            return {'status': 400, 'body': 'Ожидается путь /api/...'}
+        try:
+            match = resolve(url.partition('?')[0])
+        except Resolver404:
+            return {'status': 404, 'body': 'Не найдено'}
+        if getattr(match.func, 'cls', None) is BatchView:
+            return {'status': 400, 'body': 'Вложенный batch запрещён'}
+        response = match.func(
+            self.sub_request(request, url), *match.args, **match.kwargs
+        )
+        if not hasattr(response, 'data'):
+            return {'status': 400, 'body': 'Ответ не JSON'}
+        return {'status': response.status_code, 'body': response.data}
+
+    def post(self, request):
+        urls = request.data.get('requests')
+        if not isinstance(urls, list) or not urls:
+            raise exceptions.ValidationError(
+                detail='Передайте непустой список requests'
+            )
+        if len(urls) > settings.BATCH_MAX_REQUESTS:
+            raise exceptions.ValidationError(
+                detail=f'Не больше {settings.BATCH_MAX_REQUESTS} запросов'
+            )
+        return Response([self.run(request, url) for url in urls])
+
+
+class ChangesView(APIView):
+    """Изменения рецептов и (для вошедшего) его избранного, корзины
+    и подписок после курсора ?since=.
+    """
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request):
+        since = query_int(request, 'since', 0, 0, 2 ** 63 - 1)
+        limit = query_int(request, 'limit', 1000, 1, 5000)
+        return Response(changes_since(request.user, since, limit))
+
+
+class EventTicketView(APIView):
+    """Короткоживущий билет для ?ticket= в /api/events/ (см. api/sse.py)."""
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        return Response({
+            'ticket': make_ticket(request.user),
+            'expires_in': settings.EVENTS_TICKET_MAX_AGE,
+        })
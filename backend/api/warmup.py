@@ -0,0 +1,42 @@
+"""Прогрев процесса до форка воркеров gunicorn (--preload).
+
+Всё, что здесь загружается, воркеры наследуют от мастера готовым:
+импорты, разрешение URL и поля сериализаторов. В базу прогрев не ходит:
+соединение всё равно нельзя передать воркерам через форк, а данных,
+которые стоило бы закэшировать в памяти мастера, здесь нет.
+"""
+import time
+
+from django.urls import get_resolver, resolve
+from rest_framework.test import APIRequestFactory
+
+WARM_URLS = (
+    '/api/recipes/',
+    '/api/recipes/1/',
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/users/',
+    '/api/users/subscriptions/',
+)
+
+
+def warm_up():
+    """Возвращает время прогрева в секундах."""
+    from . import serializers
+
+    started = time.monotonic()
+    get_resolver().url_patterns
+    for url in WARM_URLS:
+        resolve(url)
+    request = APIRequestFactory().get('/')
+    context = {'request': request}
+    for serializer_class in (
+        serializers.RecipeSerializer,
+        serializers.RecipeCreateSerializer,
+        serializers.SubscriptionSerializer,
+        serializers.IngredientSerializer,
+        serializers.TagSerializer,
+        serializers.UserSerializer,
+    ):
+        serializer_class(context=context).fields
+    return time.monotonic() - started
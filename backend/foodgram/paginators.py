@@ -0,0 +1,102 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def estimated_count(queryset):
+    """Оценка числа строк по статистике планировщика Postgres.
+
+    Для запроса без условий берётся pg_class.reltuples, иначе оценка
+    строк из EXPLAIN. Для других СУБД возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+            if row is not None and row[0] >= 0:
+                return row[0]
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def approximate_count(queryset, threshold=None):
+    """Возвращает (count, is_estimated).
+
+    Если оценка меньше порога, считается точный COUNT(*). Иначе оценка
+    проверяется подсчётом не более threshold строк: промахи планировщика
+    на отфильтрованных запросах не превращают 12 строк в 50 000.
+    """
+    if not isinstance(queryset, QuerySet):
+        return len(queryset), False
+    if threshold is None:
+        threshold = settings.ESTIMATED_COUNT_THRESHOLD
+    estimate = estimated_count(queryset)
+    if estimate is None or estimate < threshold:
+        return queryset.count(), False
+    capped = queryset.order_by()[:threshold].count()
+    if capped < threshold:
+        return capped, False
+    return max(estimate, threshold), True
+
+
+class EstimatedCountPaginator(Paginator):
+    """Оценка числа строк вместо COUNT(*) на больших таблицах.
+
+    Оценка нужна только для числа страниц. Если запрошенная страница
+    лежит за оценкой, считается точный COUNT(*). Если страница вышла
+    неполной, точное число строк известно из неё самой.
+    """
+
+    count_estimated = False
+
+    @cached_property
+    def count(self):
+        count, self.count_estimated = approximate_count(self.object_list)
+        return count
+
+    def set_count(self, count):
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+        self.count_estimated = False
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.count_estimated:
+                raise
+            self.set_count(self.object_list.count())
+            return super().validate_number(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_estimated:
+            return super().page(number)
+        # Срез не обрезается по оценке: страница читается целиком.
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page])
+        if not rows and number > 1:
+            self.set_count(self.object_list.count())
+            return super().page(number)
+        if len(rows) < self.per_page:
+            self.set_count(bottom + len(rows))
+        elif bottom + len(rows) >= self.count:
+            # Полная страница на конце оценки: есть ли следующая,
+            # покажет только точный счёт.
+            self.set_count(self.object_list.count())
+        return self._get_page(rows, number, self)
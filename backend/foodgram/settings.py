@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
     'api.apps.ApiConfig',
     'djoser',
     'rest_framework',
@@ -63,6 +64,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'foodgram.slow_queries.SlowQueryMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -97,8 +100,21 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'password'),
         'HOST': os.getenv('DB_HOST', '172.17.0.2'),
         'PORT': os.getenv('DB_PORT', 5432),
+        # У recipes нет миграций: тестовая база создаётся прямо по моделям.
+        'TEST': {'MIGRATE': False},
     }
 }
+
+# Кеш общий для всех процессов (ведра throttling, кеш рецептов). Без
+# REDIS_URL — LocMem своего процесса, годится только для разработки.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -138,6 +154,14 @@ STATIC_ROOT = BASE_DIR / 'static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Неиспользуемая картинка моложе этого числа секунд не удаляется.
+UNUSED_IMAGE_MIN_AGE = 60 * 60
+
+# Выгрузки отдаёт nginx через internal location (см. infra/nginx.conf).
+EXPORTS_DIR = 'exports'
+EXPORT_TTL = 60 * 60 * 24
+USE_X_ACCEL_REDIRECT = os.getenv('USE_X_ACCEL_REDIRECT', 'False') == 'True'
+X_ACCEL_REDIRECT_LOCATION = '/protected/exports/'
 
 
 # Default primary key field type
@@ -152,10 +176,103 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.EstimatedLimitOffsetPagination',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    # Адрес клиента — последний в X-Forwarded-For, его дописывает nginx.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
     'PAGE_SIZE': 6,
 }
 
+FAST_SERIALIZERS = os.getenv('FAST_SERIALIZERS', 'False') == 'True'
+
+JOBS = {
+    'shopping_cart_pdf': {
+        'task': 'api.services.export_shopping_cart',
+        'concurrency': int(os.getenv('SHOPPING_CART_PDF_CONCURRENCY', 2)),
+        'max_attempts': 3,
+    },
+}
+# Обработчик обновляет heartbeat_at задачи каждые JOB_HEARTBEAT секунд;
+# задача без сигнала дольше JOB_TIMEOUT считается брошенной.
+JOB_HEARTBEAT = 10
+JOB_TIMEOUT = 60
+JOB_RETRY_DELAY = 5
+
+# Выше этого порога списки показывают оценку числа строк вместо COUNT(*).
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Прогрев в foodgram/wsgi.py: с gunicorn --preload выполняется до форка.
+WARM_UP_ON_LOAD = os.getenv('WARM_UP_ON_LOAD', 'True') == 'True'
+
+# Профилирование запросов staff по X-Profile / ?profile=1 и снимки памяти.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_TRACEMALLOC_FRAMES = int(
+    os.getenv('PROFILING_TRACEMALLOC_FRAMES', 0)
+)
+PROFILING_SORT = 'cumulative'
+PROFILING_LIMIT = 50
+PROFILING_REPORT_TIMEOUT = 60 * 60
+# Общий для воркеров каталог отчётов; не под MEDIA_ROOT, чтобы nginx их
+# не раздавал.
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+
+# Авторам с большим числом подписчиков лента не рассылается при публикации,
+# их рецепты подмешиваются при чтении.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+FEED_BACKFILL = 20
+
+BATCH_MAX_REQUESTS = 20
+
+# Записи журнала изменений моложе этого (сек.) ещё не отдаются клиентам.
+CHANGES_SETTLE = 2
+CHANGES_RETENTION_DAYS = 30
+
+# Живые события для /api/events/ (SSE, только под ASGI). Между процессами
+# их носит LISTEN/NOTIFY; recipes.events.LocalBackend — в пределах процесса.
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'recipes.events.PostgresBackend')
+EVENTS_CHANNEL = 'foodgram_events'
+EVENTS_QUEUE_SIZE = 100
+EVENTS_HEARTBEAT = 15
+EVENTS_REPLAY_LIMIT = 500
+# Срок жизни билета ?ticket= для EventSource, в секундах.
+EVENTS_TICKET_MAX_AGE = 60
+
+# Порог медленного запроса в мс (0 — запись выключена), доля записываемых
+# и размер буфера; смотреть в /admin/slow-queries/.
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 0))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_SAMPLE_RATE', 1))
+SLOW_QUERY_BUFFER = 200
+SLOW_QUERY_TTL = 60 * 60 * 24
+
+# Token bucket: (токенов в секунду, ёмкость ведра) для вошедших и анонимов.
+# Стоимость запроса задаёт throttle_costs вьюсета, по умолчанию 1.
+THROTTLE = {
+    'user': (float(os.getenv('THROTTLE_USER_RATE', 10)), 200),
+    'anon': (float(os.getenv('THROTTLE_ANON_RATE', 3)), 60),
+    'lease': 5,
+    # Сколько ключей с выданными воркеру пачками держать в памяти.
+    'leases': 10000,
+    'cache': 'default',
+    'timeout': 60 * 60 * 24,
+}
+
+# Период полураспада популярности рецепта, в секундах.
+TRENDING_HALF_LIFE = int(os.getenv('TRENDING_HALF_LIFE', 60 * 60 * 24 * 3))
+TRENDING_WEIGHTS = {
+    'favorite': 2.0,
+    'shopping_cart': 1.0,
+}
+# События моложе этого числа секунд учитываются следующим запуском.
+TRENDING_SETTLE = 60
+
 DJOSER = {
     "HIDE_USERS": False,
     'LOGIN_FIELD': 'email',
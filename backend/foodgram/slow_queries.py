@@ -0,0 +1,165 @@
+"""Запись медленных SQL-запросов с планами выполнения.
+
+SlowQueryMiddleware оборачивает запрос в connection.execute_wrapper и
+складывает запросы дольше SLOW_QUERY_THRESHOLD мс в кольцевой буфер в
+кеше: номер записи даёт атомарный cache.incr, запись ложится в ячейку
+номер % SLOW_QUERY_BUFFER. С Redis (REDIS_URL) буфер общий для всех
+воркеров gunicorn, с локальным кешем — у каждого свой.
+
+План для SELECT в PostgreSQL снимается не в запросе пользователя, а при
+открытии страницы в админке, и только простым EXPLAIN: запрос не
+выполняется повторно, так что pg_notify, FOR UPDATE и функции с побочными
+эффектами не срабатывают второй раз. EXPLAIN подставляет параметры в
+текст плана, поэтому строковые литералы (токены, почта) в плане и SQL
+заменяются на '...'.
+"""
+import pickle
+import random
+import re
+import time
+import traceback
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, connections
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+BASE_DIR = str(Path(settings.BASE_DIR))
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+KEY_PREFIX = 'slow_queries'
+
+
+def normalize(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def redact(text):
+    return STRING_LITERAL.sub("'...'", text)
+
+
+def slot_keys():
+    return [
+        f'{KEY_PREFIX}:{slot}' for slot in range(settings.SLOW_QUERY_BUFFER)
+    ]
+
+
+def record(query):
+    cache.add(f'{KEY_PREFIX}:next', 0, None)
+    number = cache.incr(f'{KEY_PREFIX}:next')
+    key = f'{KEY_PREFIX}:{number % settings.SLOW_QUERY_BUFFER}'
+    try:
+        cache.set(key, query, settings.SLOW_QUERY_TTL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        # Параметры, которые не сериализуются, остаются без плана.
+        query['pending'] = None
+        cache.set(key, query, settings.SLOW_QUERY_TTL)
+
+
+def recorded():
+    """Записанные запросы всех процессов, новые первыми."""
+    return sorted(
+        cache.get_many(slot_keys()).values(),
+        key=lambda query: query['time'], reverse=True
+    )
+
+
+def clear():
+    cache.delete_many([*slot_keys(), f'{KEY_PREFIX}:next'])
+
+
+def origin():
+    """Ближайший к запросу кадр кода проекта."""
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if (frame.filename.startswith(BASE_DIR)
+                and frame.filename != __file__):
+            return (f'{Path(frame.filename).relative_to(BASE_DIR)}:'
+                    f'{frame.lineno} {frame.name}')
+    return ''
+
+
+def explain(db, sql, params):
+    if db.vendor != 'postgresql' or not sql.lstrip().upper(
+    ).startswith('SELECT'):
+        return ''
+    # Сырой курсор: EXPLAIN не должен проходить через обёртку. Точка
+    # сохранения не даёт ошибке EXPLAIN сломать текущую транзакцию.
+    db.ensure_connection()
+    with db.connection.cursor() as cursor:
+        if db.in_atomic_block:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        except Exception as error:
+            plan = f'EXPLAIN не выполнен: {error}'
+            if db.in_atomic_block:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+        if db.in_atomic_block:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    return plan
+
+
+def explain_pending(queries):
+    """Снимает планы записанных запросов, у которых их ещё нет."""
+    for query in queries:
+        pending = query.pop('pending', None)
+        if pending is not None:
+            alias, sql, params = pending
+            query['plan'] = redact(
+                explain(connections[alias], sql, params)
+            )
+
+
+class SlowQueryLogger:
+
+    def __init__(self, request):
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - started) * 1000
+        if (duration >= settings.SLOW_QUERY_THRESHOLD
+                and random.random() < settings.SLOW_QUERY_SAMPLE_RATE):
+            match = self.request.resolver_match
+            record({
+                'time': timezone.now(),
+                'duration': duration,
+                'sql': redact(normalize(sql)),
+                'view': match.view_name if match else self.request.path,
+                'origin': origin(),
+                'plan': '',
+                'pending': None if many else (
+                    context['connection'].alias, sql, params
+                ),
+            })
+        return result
+
+
+class SlowQueryMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_THRESHOLD:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with connection.execute_wrapper(SlowQueryLogger(request)):
+            return self.get_response(request)
+
+
+def slow_queries_view(request):
+    queries = recorded()
+    explain_pending(queries)
+    return TemplateResponse(request, 'admin/slow_queries.html', {
+        **admin.site.each_context(request),
+        'title': 'Медленные запросы',
+        'queries': queries,
+        'threshold': settings.SLOW_QUERY_THRESHOLD,
+        'enabled': bool(settings.SLOW_QUERY_THRESHOLD),
+    })
@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from .slow_queries import slow_queries_view
+
 urlpatterns = [
     path('api/', include('api.urls', 'api')),
+    path('admin/slow-queries/', admin.site.admin_view(slow_queries_view),
+         name='slow-queries'),
     path('admin/', admin.site.urls),
 ]
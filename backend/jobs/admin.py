@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'user', 'status', 'attempts', 'created_at')
+    list_filter = ('status', 'name')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
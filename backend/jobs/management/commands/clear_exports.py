@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Удаление устаревших выгрузок и завершённых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ttl', type=int, default=settings.EXPORT_TTL,
+            help='Время жизни выгрузки в секундах'
+        )
+
+    def handle(self, *args, **options):
+        deadline = time.time() - options['ttl']
+        root = Path(settings.MEDIA_ROOT) / settings.EXPORTS_DIR
+        removed = 0
+        for path in root.glob('*/*'):
+            if path.is_file() and path.stat().st_mtime < deadline:
+                path.unlink()
+                removed += 1
+        jobs, _ = Job.objects.filter(
+            status__in=(Job.DONE, Job.FAILED),
+            finished_at__lt=timezone.now() - timedelta(seconds=options['ttl'])
+        ).delete()
+        self.stdout.write(f'Удалено файлов: {removed}, задач: {jobs}')
@@ -0,0 +1,49 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobs.services import claim, requeue_stale, run, worker_name
+
+
+def work(once=False, sleep=1.0):
+    name = worker_name()
+    while True:
+        close_old_connections()
+        requeue_stale()
+        job = claim(name)
+        if job is not None:
+            run(job)
+        elif once:
+            return
+        else:
+            time.sleep(sleep)
+
+
+class Command(BaseCommand):
+    help = 'Обработка фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--sleep', type=float, default=1.0)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи из очереди и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            work(options['once'], options['sleep'])
+            return
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=work, args=(options['once'], options['sleep'])
+            )
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(null=True, verbose_name='Последний сигнал обработчика'),
+        ),
+    ]
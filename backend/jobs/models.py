@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+
+User = get_user_model()
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=64, verbose_name='Задача')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='jobs',
+        verbose_name='Пользователь',
+    )
+    payload = models.JSONField(default=dict, verbose_name='Параметры')
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    result = models.FileField(
+        upload_to='exports/',
+        blank=True,
+        verbose_name='Результат'
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    worker = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name='Обработчик'
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Не раньше'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана'
+    )
+    started_at = models.DateTimeField(null=True, verbose_name='Начата')
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        verbose_name='Последний сигнал обработчика'
+    )
+    finished_at = models.DateTimeField(null=True, verbose_name='Завершена')
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = (
+            models.Index(fields=('status', 'run_after'),
+                         name='job_status_run_after_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,142 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(name, user=None, **payload):
+    if name not in settings.JOBS:
+        raise ValueError(f'Неизвестная задача: {name}')
+    return Job.objects.create(name=name, user=user, payload=payload)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+# Ключ pg_advisory_xact_lock, под которым выбирается следующая задача.
+CLAIM_LOCK = 7301
+
+
+def retry_at(attempts):
+    return timezone.now() + timedelta(
+        seconds=settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    )
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, чей обработчик перестал подавать
+    сигнал (heartbeat_at), или помечает их упавшими, если попытки
+    кончились.
+    """
+    deadline = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+    count = 0
+    for name, conf in settings.JOBS.items():
+        stale = Job.objects.filter(
+            name=name, status=Job.RUNNING, heartbeat_at__lt=deadline
+        )
+        count += stale.filter(
+            attempts__gte=conf.get('max_attempts', 1)
+        ).update(
+            status=Job.FAILED, worker='', finished_at=timezone.now(),
+            error='Обработчик пропал во время выполнения',
+        )
+        for job in stale.only('id', 'attempts'):
+            count += Job.objects.filter(
+                pk=job.pk, status=Job.RUNNING, heartbeat_at__lt=deadline
+            ).update(
+                status=Job.PENDING, worker='',
+                run_after=retry_at(job.attempts),
+            )
+    return count
+
+
+@transaction.atomic
+def claim(worker):
+    if connection.vendor == 'postgresql':
+        # Подсчёт выполняющихся и захват задачи — под одной блокировкой,
+        # иначе параллельные обработчики вместе превысят concurrency.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CLAIM_LOCK])
+    running = dict(
+        Job.objects.filter(status=Job.RUNNING).order_by().values(
+            'name'
+        ).annotate(count=Count('id')).values_list('name', 'count')
+    )
+    busy = [
+        name for name, conf in settings.JOBS.items()
+        if conf.get('concurrency')
+        and running.get(name, 0) >= conf['concurrency']
+    ]
+    job = Job.objects.select_for_update(skip_locked=True).filter(
+        status=Job.PENDING,
+        run_after__lte=timezone.now(),
+    ).exclude(name__in=busy).order_by('run_after', 'id').first()
+    if job is None:
+        return None
+    job.status = Job.RUNNING
+    job.attempts += 1
+    job.worker = worker
+    job.started_at = job.heartbeat_at = timezone.now()
+    job.save(update_fields=(
+        'status', 'attempts', 'worker', 'started_at', 'heartbeat_at'
+    ))
+    return job
+
+
+def heartbeat(job, stop):
+    try:
+        while not stop.wait(settings.JOB_HEARTBEAT):
+            Job.objects.filter(
+                pk=job.pk, status=Job.RUNNING, worker=job.worker
+            ).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def run(job):
+    conf = settings.JOBS[job.name]
+    stop = threading.Event()
+    beating = threading.Thread(target=heartbeat, args=(job, stop))
+    beating.start()
+    try:
+        import_string(conf['task'])(job)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < conf.get('max_attempts', 1):
+            job.status = Job.PENDING
+            job.run_after = retry_at(job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        logger.exception('Задача %s завершилась ошибкой', job)
+    else:
+        job.status = Job.DONE
+        job.error = ''
+        job.finished_at = timezone.now()
+    finally:
+        stop.set()
+        beating.join()
+    # Задачу, отданную другому обработчику, не перезаписываем.
+    owned = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, worker=job.worker
+    ).update(
+        status=job.status, error=job.error, result=job.result.name,
+        run_after=job.run_after, finished_at=job.finished_at, worker='',
+    )
+    if not owned:
+        logger.warning('Задача %s уже передана другому обработчику', job)
+    job.worker = ''
+    return job
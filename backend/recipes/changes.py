@@ -0,0 +1,100 @@
+"""Журнал изменений для инкрементальной синхронизации клиентов.
+
+Записи добавляются в тех же транзакциях, что и сами изменения; курсор —
+id записи. Чтобы транзакция, получившая меньший id, но закоммиченная
+позже, не оказалась за курсором клиента, самые свежие записи
+(моложе CHANGES_SETTLE секунд) отдаются только следующим запросом.
+Поэтому запись в журнал — последний шаг транзакции: от вставки записи
+до коммита должно пройти меньше CHANGES_SETTLE, как бы долго ни шла
+сама транзакция.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .events import publish_changes
+from .models import Change
+
+USER_KINDS = {
+    Change.FAVORITE: 'favorites',
+    Change.SHOPPING_CART: 'shopping_cart',
+    Change.SUBSCRIPTION: 'subscriptions',
+}
+
+
+def log_change(kind, action, object_id, user=None):
+    change = Change.objects.create(
+        kind=kind, action=action, object_id=object_id, user=user
+    )
+    publish_changes([change])
+
+
+def log_changes(kind, action, object_ids, user=None):
+    changes = Change.objects.bulk_create(
+        Change(kind=kind, action=action, object_id=object_id, user=user)
+        for object_id in object_ids
+    )
+    publish_changes(changes)
+
+
+def recipe_state(actions):
+    if Change.DELETED in actions:
+        return Change.DELETED
+    if Change.CREATED in actions:
+        return Change.CREATED
+    return Change.UPDATED
+
+
+def changes_since(user, since, limit):
+    """Изменения после курсора since, свёрнутые по объектам.
+
+    reset=True означает, что курсора нет или записи до него уже удалены,
+    и клиенту нужна полная синхронизация.
+    """
+    reset = not since or not Change.objects.filter(id__lte=since).exists()
+    visible = Q(user__isnull=True)
+    if user.is_authenticated:
+        visible |= Q(user=user)
+    rows = list(
+        Change.objects.filter(
+            visible,
+            id__gt=since or 0,
+            created_at__lt=timezone.now() - timedelta(
+                seconds=settings.CHANGES_SETTLE
+            ),
+        ).order_by('id').values_list(
+            'id', 'kind', 'action', 'object_id'
+        )[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    recipes = {}
+    toggles = {name: {} for name in USER_KINDS.values()}
+    for _, kind, action, object_id in rows:
+        if kind == Change.RECIPE:
+            recipes.setdefault(object_id, set()).add(action)
+        else:
+            toggles[USER_KINDS[kind]][object_id] = action
+    result = {
+        'cursor': rows[-1][0] if rows else since or 0,
+        'more': more,
+        'reset': reset,
+        'recipes': {
+            action: sorted(
+                object_id for object_id, actions in recipes.items()
+                if recipe_state(actions) == action
+            )
+            for action in (Change.CREATED, Change.UPDATED, Change.DELETED)
+        },
+    }
+    for name, states in toggles.items():
+        result[name] = {
+            action: sorted(
+                object_id for object_id, state in states.items()
+                if state == action
+            )
+            for action in (Change.ADDED, Change.REMOVED)
+        }
+    return result
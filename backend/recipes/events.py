@@ -0,0 +1,186 @@
+"""Живые события корзины, избранного и подписок для SSE.
+
+Записи журнала изменений пользователя после коммита публикуются через
+бэкенд из настройки EVENTS_BACKEND и раздаются очередям открытых
+соединений этого процесса (Hub). LocalBackend работает в пределах
+одного процесса, PostgresBackend связывает процессы через LISTEN/NOTIFY.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Очередь соединения переполнена или события могли потеряться:
+# клиенту нужно перечитать состояние.
+RESET = {'kind': 'reset'}
+
+
+class Hub:
+    """Очереди открытых соединений этого процесса по id пользователя."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues = defaultdict(set)
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+        listener = (asyncio.get_running_loop(), queue)
+        with self.lock:
+            self.queues[user_id].add(listener)
+        return listener
+
+    def unsubscribe(self, user_id, listener):
+        with self.lock:
+            self.queues[user_id].discard(listener)
+            if not self.queues[user_id]:
+                del self.queues[user_id]
+
+    def deliver(self, event):
+        with self.lock:
+            listeners = list(self.queues.get(event['user'], ()))
+        for loop, queue in listeners:
+            loop.call_soon_threadsafe(put, queue, event)
+
+    def reset(self):
+        with self.lock:
+            listeners = [
+                listener for queues in self.queues.values()
+                for listener in queues
+            ]
+        for loop, queue in listeners:
+            loop.call_soon_threadsafe(put, queue, RESET)
+
+
+def put(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESET)
+
+
+class LocalBackend:
+    """События не покидают процесс. Для разработки и тестов."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, event):
+        self.hub.deliver(event)
+
+
+class PostgresBackend:
+    """pg_notify при публикации и поток с LISTEN в каждом процессе,
+    где есть открытые соединения.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.channel = settings.EVENTS_CHANNEL
+        self.ready = threading.Event()
+
+    def start(self):
+        threading.Thread(
+            target=self.listen, name='events-listener', daemon=True
+        ).start()
+        self.ready.wait(5)
+
+    def publish(self, event):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)', [self.channel, json.dumps(event)]
+            )
+
+    def listen(self):
+        while True:
+            try:
+                self.consume()
+            except Exception:
+                logger.exception('Прослушивание событий прервано')
+                time.sleep(1)
+
+    def consume(self):
+        wrapper = connections[DEFAULT_DB_ALIAS]
+        raw = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(
+                    f'LISTEN {wrapper.ops.quote_name(self.channel)}'
+                )
+            if self.ready.is_set():
+                # Пока соединения не было, события могли пройти мимо.
+                self.hub.reset()
+            self.ready.set()
+            while True:
+                select.select([raw], [], [], 5)
+                raw.poll()
+                while raw.notifies:
+                    self.hub.deliver(json.loads(raw.notifies.pop(0).payload))
+        finally:
+            raw.close()
+
+
+hub = Hub()
+_backend = None
+_started = False
+_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = import_string(settings.EVENTS_BACKEND)(hub)
+    return _backend
+
+
+def start():
+    """Запускает приём событий; нужен только процессу с SSE-соединениями."""
+    global _started
+    backend = get_backend()
+    with _lock:
+        if not _started:
+            backend.start()
+            _started = True
+
+
+def change_event(change):
+    return {
+        'id': change.pk,
+        'user': change.user_id,
+        'kind': change.kind,
+        'action': change.action,
+        'object_id': change.object_id,
+    }
+
+
+def publish_changes(changes):
+    events = [
+        change_event(change) for change in changes
+        if change.user_id is not None and change.pk is not None
+    ]
+    if events:
+        transaction.on_commit(lambda: send(events))
+
+
+def send(events):
+    backend = get_backend()
+    for event in events:
+        try:
+            backend.publish(event)
+        except DatabaseError:
+            logger.exception('Не удалось опубликовать событие')
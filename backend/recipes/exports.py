@@ -0,0 +1,30 @@
+def recipe_document(recipe):
+    """Рецепт для выгрузок; ждёт select_related('author') и prefetch
+    'tags', 'recipe_ingredients__ingredient'.
+    """
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date and recipe.pub_date.isoformat(),
+        'author': {
+            'email': recipe.author.email,
+            'username': recipe.author.username,
+            'first_name': recipe.author.first_name,
+            'last_name': recipe.author.last_name,
+        },
+        'tags': [
+            {'name': tag.name, 'slug': tag.slug, 'color': tag.color}
+            for tag in recipe.tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.recipe_ingredients.all()
+        ],
+        'image': recipe.image.name,
+    }
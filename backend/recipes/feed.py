@@ -0,0 +1,113 @@
+"""Лента новых рецептов от авторов, на которых подписан пользователь.
+
+Рецепт обычного автора при создании раскладывается по лентам подписчиков
+(fan-out on write). Если подписчиков больше FEED_FANOUT_LIMIT, рецепт
+остаётся с in_timelines=False и подмешивается в ленту при чтении
+(fan-in on read) по частичному индексу recipe_fan_in_idx.
+"""
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from users.models import Subscription
+
+from .models import FeedEntry, Recipe
+
+
+def fan_out(recipe):
+    limit = settings.FEED_FANOUT_LIMIT
+    subscriber_ids = list(
+        Subscription.objects.filter(user_id=recipe.author_id).values_list(
+            'subscriber_id', flat=True
+        )[:limit + 1]
+    )
+    if len(subscriber_ids) > limit:
+        return
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                subscriber_id=subscriber_id,
+                author_id=recipe.author_id,
+                recipe=recipe,
+                pub_date=recipe.pub_date,
+            )
+            for subscriber_id in subscriber_ids
+        ],
+        batch_size=1000
+    )
+    Recipe.objects.filter(pk=recipe.pk).update(in_timelines=True)
+
+
+def follow(subscriber, author):
+    """Добавляет в ленту последние разосланные рецепты нового автора."""
+    recipes = Recipe.objects.filter(
+        author=author, in_timelines=True
+    ).order_by('-pub_date', '-id').values_list(
+        'id', 'pub_date'
+    )[:settings.FEED_BACKFILL]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                subscriber=subscriber,
+                author=author,
+                recipe_id=recipe_id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in recipes
+        ],
+        ignore_conflicts=True
+    )
+
+
+def unfollow(subscriber, author):
+    FeedEntry.objects.filter(subscriber=subscriber, author=author).delete()
+
+
+def encode_cursor(pub_date, recipe_id):
+    return base64.urlsafe_b64encode(
+        f'{pub_date.isoformat()}|{recipe_id}'.encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (pub_date, recipe_id) или None для битого курсора."""
+    try:
+        pub_date, recipe_id = base64.urlsafe_b64decode(
+            cursor.encode()
+        ).decode().split('|')
+        return datetime.fromisoformat(pub_date), int(recipe_id)
+    except ValueError:
+        return None
+
+
+def feed_page(user, limit, after=None):
+    """Страница ленты: [(pub_date, recipe_id)] по убыванию, не больше limit.
+
+    Два запроса по индексам — разосланные записи и рецепты fan-in-авторов,
+    каждый ограничен limit, затем слияние.
+    """
+    entries = FeedEntry.objects.filter(subscriber=user)
+    fan_in = Recipe.objects.filter(
+        author__in=Subscription.objects.filter(
+            subscriber=user
+        ).values('user_id'),
+        in_timelines=False,
+        pub_date__isnull=False,
+    )
+    if after is not None:
+        pub_date, recipe_id = after
+        entries = entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        )
+        fan_in = fan_in.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=recipe_id)
+        )
+    rows = list(entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit])
+    rows += fan_in.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id'
+    )[:limit]
+    return sorted(rows, reverse=True)[:limit]
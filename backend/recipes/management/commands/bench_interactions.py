@@ -0,0 +1,101 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+LAYOUTS = {
+    'plain': '',
+    'hash': 'PARTITION BY HASH (user_id)',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнение вставки, удаления и проверки наличия в обычной и '
+            'секционированной по hash(user_id) таблице (PostgreSQL). '
+            'Работает на временных таблицах, данные проекта не трогает.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--partitions', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=2000)
+
+    def create(self, cursor, layout, options):
+        table = f'bench_{layout}'
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {table} ('
+            'id bigint GENERATED BY DEFAULT AS IDENTITY, '
+            'user_id bigint NOT NULL, recipe_id bigint NOT NULL, '
+            'PRIMARY KEY (id, user_id), UNIQUE (user_id, recipe_id)'
+            f') {LAYOUTS[layout]}'
+        )
+        if LAYOUTS[layout]:
+            for remainder in range(options['partitions']):
+                cursor.execute(
+                    f'CREATE TEMPORARY TABLE {table}_p{remainder} '
+                    f'PARTITION OF {table} FOR VALUES WITH '
+                    f'(MODULUS {options["partitions"]}, '
+                    f'REMAINDER {remainder})'
+                )
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, recipe_id) '
+            'SELECT 1 + n %% %s, 1 + (n / %s) %% %s '
+            'FROM generate_series(0, %s - 1) n ON CONFLICT DO NOTHING',
+            [options['users'], options['users'], options['recipes'],
+             options['rows']]
+        )
+        cursor.execute(f'CREATE INDEX ON {table} (recipe_id)')
+        cursor.execute(f'ANALYZE {table}')
+        return table
+
+    def measure(self, cursor, sql, params_list):
+        timings = []
+        for params in params_list:
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            if cursor.description:
+                cursor.fetchall()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return (statistics.median(timings) * 1000,
+                timings[int(len(timings) * 0.99) - 1] * 1000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Нужен PostgreSQL')
+        rng = random.Random(0)
+        pairs = [
+            (rng.randint(1, options['users']),
+             options['recipes'] + rng.randint(1, options['recipes']))
+            for _ in range(options['operations'])
+        ]
+        users = [(user_id,) for user_id, _ in pairs]
+        with connection.cursor() as cursor:
+            for layout in LAYOUTS:
+                started = time.perf_counter()
+                table = self.create(cursor, layout, options)
+                self.stdout.write(
+                    f'{layout}: загрузка {options["rows"]} строк '
+                    f'{time.perf_counter() - started:.1f} с'
+                )
+                for name, sql, params in (
+                    ('insert', f'INSERT INTO {table} (user_id, recipe_id) '
+                               'VALUES (%s, %s)', pairs),
+                    ('exists', f'SELECT EXISTS (SELECT 1 FROM {table} '
+                               'WHERE user_id = %s AND recipe_id = %s)',
+                     pairs),
+                    ('by_user', f'SELECT recipe_id FROM {table} '
+                                'WHERE user_id = %s', users),
+                    ('delete', f'DELETE FROM {table} '
+                               'WHERE user_id = %s AND recipe_id = %s',
+                     pairs),
+                ):
+                    median, p99 = self.measure(cursor, sql, params)
+                    self.stdout.write(
+                        f'  {name:8} медиана {median:.3f} мс, '
+                        f'p99 {p99:.3f} мс'
+                    )
+                cursor.execute(f'DROP TABLE {table}')
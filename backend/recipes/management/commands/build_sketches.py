@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.similarity import store_sketches
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт MinHash-подписей рецептов для поиска похожих'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        last_id = 0
+        total = 0
+        while True:
+            ids = list(
+                Recipe.objects.filter(pk__gt=last_id).order_by(
+                    'pk'
+                ).values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                store_sketches(ids)
+            total += len(ids)
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Подписи пересчитаны для {total} рецептов '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
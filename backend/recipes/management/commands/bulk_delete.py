@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+from recipes.services import delete_recipes, delete_user
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пакетное удаление пользователя или рецептов со связанными данными'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--user', help='id или email пользователя')
+        group.add_argument('--recipes', type=int, nargs='+',
+                           help='id рецептов')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['user']:
+            lookup = options['user']
+            field = 'pk' if lookup.isdigit() else 'email'
+            try:
+                user = User.objects.get(**{field: lookup})
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {lookup} не найден')
+            deleted, seconds = delete_user(user, options['batch_size'])
+        else:
+            deleted, seconds = delete_recipes(
+                Recipe.objects.filter(pk__in=options['recipes']),
+                options['batch_size']
+            )
+        for label, count in sorted(deleted.items()):
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Готово за {seconds:.2f} с'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import CartIngredientTotal
+from recipes.services import cart_totals_from_cart, rebuild_cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Сверка итогов корзин с ShoppingCart'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать итоги пользователей с расхождениями'
+        )
+
+    def handle(self, *args, **options):
+        expected = cart_totals_from_cart()
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in CartIngredientTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total'
+            ).iterator(chunk_size=10000)
+        }
+        broken = {}
+        for key in expected.keys() | stored.keys():
+            if expected.get(key) != stored.get(key):
+                broken[key] = (stored.get(key), expected.get(key))
+        for (user_id, ingredient_id), (found, total) in sorted(
+            broken.items()
+        ):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'{found} вместо {total}'
+            )
+        if not broken:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        if options['fix']:
+            user_ids = {user_id for user_id, _ in broken}
+            rebuild_cart_totals(user_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f'Итоги пересобраны для {len(user_ids)} пользователей'
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождений: {len(broken)}'
+            ))
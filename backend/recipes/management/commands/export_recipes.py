@@ -0,0 +1,83 @@
+import base64
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.exports import recipe_document
+from recipes.models import Recipe
+
+
+def last_exported_id(path):
+    """Обрезает недописанную строку в конце файла и возвращает id
+    последнего целиком записанного рецепта (0, если файл пуст).
+    """
+    with open(path, 'rb+') as file:
+        end = file.seek(0, os.SEEK_END)
+        position = end
+        tail = b''
+        while position > 0:
+            step = min(65536, position)
+            position -= step
+            file.seek(position)
+            tail = file.read(step) + tail
+            if tail.count(b'\n') >= 2 or position == 0:
+                break
+        complete = tail[:tail.rfind(b'\n') + 1]
+        file.truncate(end - len(tail) + len(complete))
+        lines = complete.splitlines()
+    if not lines:
+        return 0
+    return json.loads(lines[-1])['id']
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов в JSON Lines (по рецепту на строку)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Файл или - для stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--inline-images', action='store_true',
+            help='Вкладывать картинки в base64, а не только путь'
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Дописать файл, продолжив после последнего рецепта'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        last_id = 0
+        if options['resume']:
+            if output == '-':
+                raise CommandError('--resume работает только с файлом')
+            if os.path.exists(output):
+                last_id = last_exported_id(output)
+        recipes = Recipe.objects.filter(pk__gt=last_id).order_by(
+            'pk'
+        ).select_related('author').prefetch_related(
+            'tags', 'recipe_ingredients__ingredient'
+        )
+        file = (
+            sys.stdout if output == '-'
+            else open(output, 'a' if last_id else 'w', encoding='utf-8')
+        )
+        count = 0
+        try:
+            for recipe in recipes.iterator(chunk_size=options['chunk_size']):
+                document = recipe_document(recipe)
+                if options['inline_images'] and recipe.image:
+                    with recipe.image.open('rb') as image:
+                        document['image_data'] = base64.b64encode(
+                            image.read()
+                        ).decode()
+                file.write(json.dumps(document, ensure_ascii=False) + '\n')
+                count += 1
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {count} (после id {last_id})'
+        ))
@@ -0,0 +1,55 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Удаление файлов картинок, на которые не ссылается ни один рецепт'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--min-age', type=int, default=settings.UNUSED_IMAGE_MIN_AGE,
+            help='Не трогать файлы моложе указанного числа секунд'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.storage = Recipe._meta.get_field('image').storage
+        self.min_age = options['min_age']
+        # Только каталог хранилища картинок рецептов: остальные файлы
+        # MEDIA_ROOT (старые загрузки, выгрузки) Recipe.image не описывает.
+        root = Path(self.storage.location)
+        deadline = time.time() - self.min_age
+        removed = 0
+        batch = {}
+        for path in (root / self.storage.prefix).rglob('*'):
+            if not path.is_file() or path.stat().st_mtime > deadline:
+                continue
+            batch[path.relative_to(root).as_posix()] = path
+            if len(batch) >= options['batch_size']:
+                removed += self.remove_orphans(batch, options['dry_run'])
+                batch = {}
+        removed += self.remove_orphans(batch, options['dry_run'])
+        verb = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(f'{verb} неиспользуемых файлов: {removed}')
+
+    def remove_orphans(self, batch, dry_run):
+        used = set(Recipe.objects.filter(image__in=batch).values_list(
+            'image', flat=True
+        ))
+        removed = 0
+        for name, path in batch.items():
+            if name in used:
+                continue
+            if dry_run:
+                self.stdout.write(str(path))
+            elif not self.storage.delete_unused(name, self.min_age):
+                # Файл тронули после обхода: его снова загрузили.
+                continue
+            removed += 1
+        return removed
@@ -0,0 +1,226 @@
+import base64
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.changes import log_changes
+from recipes.models import Change, Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.similarity import store_sketches
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Загрузка рецептов из JSON Lines. Рецепты с уже существующим '
+            'названием пропускаются, поэтому прерванную загрузку можно '
+            'просто запустить заново.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def warn(self, message):
+        self.stderr.write(self.style.WARNING(message))
+
+    def free_username(self, username, taken):
+        taken = taken | set(User.objects.filter(
+            username__startswith=f'{username}_'
+        ).values_list('username', flat=True))
+        number = 2
+        while f'{username}_{number}' in taken:
+            number += 1
+        return f'{username}_{number}'
+
+    def authors(self, rows):
+        """Авторы по почте. Новый автор, чей username уже занят, создаётся
+        под свободным username с числовым суффиксом.
+        """
+        emails = {row['author']['email'] for row in rows}
+        found = dict(User.objects.filter(email__in=emails).values_list(
+            'email', 'id'
+        ))
+        new = {}
+        for row in rows:
+            if row['author']['email'] not in found:
+                new.setdefault(row['author']['email'], row['author'])
+        if not new:
+            return found
+        taken = set(User.objects.filter(
+            username__in={author['username'] for author in new.values()}
+        ).values_list('username', flat=True))
+        users = []
+        for email, author in new.items():
+            author = dict(author)
+            if author['username'] in taken:
+                username = self.free_username(author['username'], taken)
+                self.warn(
+                    f'Имя пользователя {author["username"]} занято, '
+                    f'автор {email} создан как {username}'
+                )
+                author['username'] = username
+            taken.add(author['username'])
+            user = User(**author)
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users)
+        found.update(User.objects.filter(email__in=new).values_list(
+            'email', 'id'
+        ))
+        return found
+
+    def tags(self, rows):
+        """Теги по слагу. Старые выгрузки содержат только слаги, новые —
+        название и цвет; занятое другим тегом название дополняется слагом.
+        """
+        exported = {}
+        for row in rows:
+            for tag in row['tags']:
+                if isinstance(tag, str):
+                    tag = {'slug': tag}
+                exported.setdefault(tag['slug'], tag)
+        found = dict(Tag.objects.filter(slug__in=exported).values_list(
+            'slug', 'id'
+        ))
+        new = [tag for slug, tag in exported.items() if slug not in found]
+        if new:
+            taken = set(Tag.objects.filter(
+                name__in={tag.get('name', tag['slug']) for tag in new}
+            ).values_list('name', flat=True))
+            tags = []
+            for tag in new:
+                name = tag.get('name', tag['slug'])
+                if name in taken:
+                    self.warn(
+                        f'Тег с названием {name} уже есть, тег {tag["slug"]} '
+                        f'создан как {name} ({tag["slug"]})'
+                    )
+                    name = f'{name} ({tag["slug"]})'
+                taken.add(name)
+                tags.append(Tag(
+                    name=name, slug=tag['slug'],
+                    **({'color': tag['color']} if tag.get('color') else {})
+                ))
+            Tag.objects.bulk_create(tags)
+            found.update(Tag.objects.filter(
+                slug__in=[tag['slug'] for tag in new]
+            ).values_list('slug', 'id'))
+        return found
+
+    def ingredients(self, rows):
+        """Ингредиенты по названию (оно уникально): {name: (id, unit)}."""
+        units = {}
+        for row in rows:
+            for item in row['ingredients']:
+                units.setdefault(item['name'], item['measurement_unit'])
+        found = {
+            name: (pk, unit) for pk, name, unit
+            in Ingredient.objects.filter(name__in=units).values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        new = [
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in units.items() if name not in found
+        ]
+        if new:
+            Ingredient.objects.bulk_create(new)
+            found.update(
+                (ingredient.name, (ingredient.pk, ingredient.measurement_unit))
+                for ingredient in new
+            )
+        return found
+
+    def unit_mismatches(self, row, ingredients):
+        return [
+            f'{item["name"]}: {item["measurement_unit"]} вместо '
+            f'{ingredients[item["name"]][1]}'
+            for item in row['ingredients']
+            if item['measurement_unit'] != ingredients[item['name']][1]
+        ]
+
+    def image(self, row):
+        if row.get('image_data'):
+            return Recipe._meta.get_field('image').storage.save(
+                row['image'], ContentFile(base64.b64decode(row['image_data']))
+            )
+        return row['image']
+
+    @transaction.atomic
+    def import_batch(self, rows):
+        existing = set(Recipe.objects.filter(
+            name__in=[row['name'] for row in rows]
+        ).values_list('name', flat=True))
+        rows = [row for row in rows if row['name'] not in existing]
+        if not rows:
+            return 0
+        ingredients = self.ingredients(rows)
+        checked = []
+        for row in rows:
+            mismatches = self.unit_mismatches(row, ingredients)
+            if mismatches:
+                self.warn(
+                    f'Рецепт {row["name"]} пропущен, другие единицы '
+                    f'измерения: {"; ".join(mismatches)}'
+                )
+            else:
+                checked.append(row)
+        rows = checked
+        if not rows:
+            return 0
+        authors = self.authors(rows)
+        tags = self.tags(rows)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                name=row['name'],
+                text=row['text'],
+                cooking_time=row['cooking_time'],
+                author_id=authors[row['author']['email']],
+                image=self.image(row),
+            )
+            for row in rows
+        )
+        for recipe, row in zip(recipes, rows):
+            if row.get('pub_date'):
+                recipe.pub_date = datetime.fromisoformat(row['pub_date'])
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredients[item['name']][0],
+                amount=item['amount'],
+            )
+            for recipe, row in zip(recipes, rows)
+            for item in row['ingredients']
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(
+                recipe_id=recipe.pk,
+                tag_id=tags[tag if isinstance(tag, str) else tag['slug']],
+            )
+            for recipe, row in zip(recipes, rows)
+            for tag in row['tags']
+        )
+        ids = [recipe.pk for recipe in recipes]
+        store_sketches(ids)
+        log_changes(Change.RECIPE, Change.CREATED, ids)
+        return len(recipes)
+
+    def handle(self, *args, **options):
+        imported = read = 0
+        with open(options['input'], encoding='utf-8') as file:
+            rows = (json.loads(line) for line in file if line.strip())
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                read += len(batch)
+                imported += self.import_batch(batch)
+                self.stdout.write(f'Прочитано {read}, загружено {imported}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {imported} из {read}'
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.partitioning import (MODELS, is_partitioned, partition,
+                                  partition_sql)
+
+
+class Command(BaseCommand):
+    help = ('Перевод избранного и корзины в таблицы, секционированные '
+            'по hash(user_id) (PostgreSQL)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=16)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только вывести SQL'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Секционирование доступно только в PostgreSQL')
+        if options['partitions'] < 2:
+            raise CommandError('Нужно не меньше двух секций')
+        for model in MODELS:
+            table = model._meta.db_table
+            if is_partitioned(model):
+                self.stdout.write(f'{table}: уже секционирована')
+                continue
+            if options['dry_run']:
+                for statement in partition_sql(model, options['partitions']):
+                    self.stdout.write(f'{statement};')
+                continue
+            with transaction.atomic():
+                partition(model, options['partitions'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{table}: {options["partitions"]} секций'
+            ))
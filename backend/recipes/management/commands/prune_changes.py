@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Change
+
+
+class Command(BaseCommand):
+    help = 'Удаление старых записей журнала изменений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.CHANGES_RETENTION_DAYS
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        border = timezone.now() - timedelta(days=options['days'])
+        last = Change.objects.filter(created_at__lt=border).order_by(
+            '-id'
+        ).values_list('id', flat=True).first()
+        total = 0
+        while last is not None:
+            ids = list(Change.objects.filter(id__lte=last).order_by(
+                'id'
+            ).values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += Change.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {total}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import TrendingScore
+from recipes.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = 'Учёт новых добавлений в избранное и корзину в популярности'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        state = refresh_trending(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярность обновлена: {TrendingScore.objects.count()} '
+            f'рецептов, избранное до id {state.last_favorite_id}, '
+            f'корзина до id {state.last_shopping_cart_id}'
+        ))
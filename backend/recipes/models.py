@@ -4,6 +4,8 @@ from django.db import models
 from django.db.models import Exists, OuterRef
 from django.core.validators import MinValueValidator
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -90,7 +92,11 @@ class Recipe(models.Model):
         related_name='authored_recipes',
         verbose_name='Автор',
     )
-    image = models.ImageField(verbose_name='Картинка')
+    image = models.ImageField(
+        verbose_name='Картинка',
+        storage=ContentAddressedStorage(),
+        db_index=True,
+    )
     text = models.TextField(verbose_name='Описание')
     tags = models.ManyToManyField(Tag, verbose_name='тэг')
     ingredients = models.ManyToManyField(
@@ -110,6 +116,14 @@ class Recipe(models.Model):
         auto_now_add=True,
         null=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    in_timelines = models.BooleanField(
+        'Разослан в ленты подписчиков',
+        default=False,
+    )
     is_favorited = models.ManyToManyField(
         User,
         through='Favorite',
@@ -128,6 +142,14 @@ class Recipe(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            # Рецепты, которые лента собирает при чтении (fan-in).
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                condition=models.Q(in_timelines=False),
+                name='recipe_fan_in_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -178,6 +200,11 @@ class Favorite(models.Model):
         related_name='in_favorite',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         ordering = ('user',)
@@ -205,6 +232,11 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         related_name='shopping_cart'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         verbose_name = 'Корзина'
@@ -216,3 +248,197 @@ class ShoppingCart(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user} {self.recipe}'
+
+
+class FeedEntry(models.Model):
+    subscriber = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(fields=('subscriber', 'recipe'),
+                                    name='subscriber_recipe_feed_unique'),
+        )
+        indexes = (
+            models.Index(fields=('subscriber', '-pub_date', '-recipe'),
+                         name='feed_subscriber_keyset_idx'),
+            models.Index(fields=('subscriber', 'author'),
+                         name='feed_subscriber_author_idx'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.subscriber} {self.recipe}'
+
+
+class Change(models.Model):
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Корзина'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ADDED = 'added'
+    REMOVED = 'removed'
+    ACTIONS = (
+        (CREATED, 'Создан'),
+        (UPDATED, 'Изменён'),
+        (DELETED, 'Удалён'),
+        (ADDED, 'Добавлен'),
+        (REMOVED, 'Убран'),
+    )
+
+    kind = models.CharField('Объект', max_length=16, choices=KINDS)
+    action = models.CharField('Действие', max_length=16, choices=ACTIONS)
+    object_id = models.BigIntegerField('id объекта')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Пользователь',
+    )
+    created_at = models.DateTimeField('Дата', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = (
+            models.Index(fields=('user', 'id'), name='change_user_id_idx'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.id} {self.kind} {self.action} {self.object_id}'
+
+
+class CartIngredientTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='cart_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='cart_totals'
+    )
+    total = models.BigIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Итог корзины'
+        verbose_name_plural = 'Итоги корзины'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='user_ingredient_cart_total'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.user} {self.ingredient} {self.total}'
+
+
+class RecipeSketch(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='sketch',
+        verbose_name='Рецепт',
+    )
+    signature = models.BinaryField(verbose_name='MinHash-подпись')
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id}'
+
+
+class RecipeSketchBand(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='sketch_bands',
+        verbose_name='Рецепт',
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    bucket = models.BigIntegerField(verbose_name='Корзина LSH')
+
+    class Meta:
+        verbose_name = 'Полоса LSH'
+        verbose_name_plural = 'Полосы LSH'
+        indexes = (
+            models.Index(fields=('band', 'bucket'),
+                         name='sketch_band_bucket_idx'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id} {self.band}:{self.bucket}'
+
+
+class TrendingScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(db_index=True, verbose_name='Рейтинг')
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id} {self.score}'
+
+
+class TrendingState(models.Model):
+    epoch = models.DateTimeField(verbose_name='Точка отсчёта')
+    last_favorite_id = models.BigIntegerField(
+        default=0,
+        verbose_name='Последнее учтённое избранное',
+    )
+    last_shopping_cart_id = models.BigIntegerField(
+        default=0,
+        verbose_name='Последняя учтённая покупка',
+    )
+    refreshed_at = models.DateTimeField(
+        null=True,
+        verbose_name='Дата обновления',
+    )
+
+    class Meta:
+        verbose_name = 'Состояние популярности'
+        verbose_name_plural = 'Состояние популярности'
+
+    def __str__(self) -> str:
+        return f'{self.refreshed_at}'
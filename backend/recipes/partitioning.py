@@ -0,0 +1,90 @@
+"""Перевод Favorite и ShoppingCart в таблицы, секционированные
+по хешу user_id (только PostgreSQL).
+
+Первичный ключ секционированной таблицы обязан включать ключ секций,
+поэтому он становится (id, user_id); id по-прежнему уникален за счёт
+identity-последовательности, и Django продолжает работать с ним как с pk.
+Уникальность (user, recipe) сохраняется: в ограничение входит user_id.
+"""
+from django.db import connection
+
+from .models import Favorite, ShoppingCart
+
+MODELS = (Favorite, ShoppingCart)
+
+
+def qn(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(model):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p '
+            'JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s',
+            [model._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_sql(model, partitions):
+    """SQL перевода таблицы model в partitions секций по hash(user_id)."""
+    table = model._meta.db_table
+    old = f'{table}_unpartitioned'
+    statements = [
+        f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE',
+        f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}',
+        f'CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS '
+        f'INCLUDING IDENTITY) PARTITION BY HASH ({qn("user_id")})',
+    ]
+    statements += [
+        f'CREATE TABLE {qn(f"{table}_p{remainder}")} PARTITION OF '
+        f'{qn(table)} FOR VALUES WITH '
+        f'(MODULUS {partitions}, REMAINDER {remainder})'
+        for remainder in range(partitions)
+    ]
+    columns = ', '.join(
+        qn(field.column) for field in model._meta.local_concrete_fields
+    )
+    statements += [
+        f'INSERT INTO {qn(table)} ({columns}) '
+        f'OVERRIDING SYSTEM VALUE SELECT {columns} FROM {qn(old)}',
+        f'DROP TABLE {qn(old)}',
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f'COALESCE((SELECT MAX({qn("id")}) FROM {qn(table)}), 0) + 1, '
+        f'false)',
+        f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f"{table}_pkey")} '
+        f'PRIMARY KEY ({qn("id")}, {qn("user_id")})',
+    ]
+    for constraint in model._meta.constraints:
+        fields = ', '.join(
+            qn(model._meta.get_field(name).column)
+            for name in constraint.fields
+        )
+        statements.append(
+            f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(constraint.name)} '
+            f'UNIQUE ({fields})'
+        )
+    for field in model._meta.local_concrete_fields:
+        if field.remote_field:
+            target = field.remote_field.model._meta
+            statements.append(
+                f'ALTER TABLE {qn(table)} ADD CONSTRAINT '
+                f'{qn(f"{table}_{field.column}_fk")} '
+                f'FOREIGN KEY ({qn(field.column)}) REFERENCES '
+                f'{qn(target.db_table)} ({qn(target.pk.column)}) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+        if field.db_index and field.column != 'user_id':
+            # По user_id уже есть индексы ограничений: он в них первый.
+            statements.append(
+                f'CREATE INDEX {qn(f"{table}_{field.column}_idx")} '
+                f'ON {qn(table)} ({qn(field.column)})'
+            )
+    return statements
+
+
+def partition(model, partitions):
+    with connection.cursor() as cursor:
+        for statement in partition_sql(model, partitions):
+            cursor.execute(statement)
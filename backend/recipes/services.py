@@ -0,0 +1,255 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from .changes import log_changes
+from .models import (CartIngredientTotal, Change, Favorite, Recipe,
+                     RecipeIngredient, ShoppingCart)
+from .trending import withdraw
+
+
+def _dependent_relations(model):
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete
+        and (field.one_to_one or field.one_to_many)
+    ]
+
+
+def delete_queryset(queryset, deleted, restricted=None):
+    """Удаляет строки queryset и всё, что на них ссылается, без загрузки
+    объектов в Python: по одному DELETE ... WHERE fk IN (SELECT ...) на
+    таблицу. Сигналы pre_delete/post_delete не отправляются.
+
+    on_delete соблюдается как у Collector: PROTECT сразу поднимает
+    ProtectedError, RESTRICT — RestrictedError, если ссылающиеся строки
+    не удалились каскадом по другому пути. Вызывать в транзакции: ошибка
+    откатывает уже выполненные DELETE.
+    """
+    top = restricted is None
+    if top:
+        restricted = []
+    for relation in _dependent_relations(queryset.model):
+        field = relation.field
+        related = relation.related_model._base_manager.filter(
+            **{f'{field.name}__in': queryset.values('pk')}
+        )
+        if relation.on_delete is models.CASCADE:
+            delete_queryset(related, deleted, restricted)
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{field.name: None})
+        elif relation.on_delete is models.SET_DEFAULT:
+            related.update(**{field.name: field.get_default()})
+        elif relation.on_delete is models.PROTECT:
+            if related.exists():
+                raise models.ProtectedError(
+                    f'Удаление {queryset.model._meta.label} запрещено '
+                    f'ссылками из {field.model._meta.label}.{field.name}',
+                    set(related[:10]),
+                )
+        elif relation.on_delete is models.RESTRICT:
+            restricted.append((field, list(
+                related.values_list('pk', flat=True)
+            )))
+        elif relation.on_delete is not models.DO_NOTHING:
+            raise ValueError(
+                f'{field.model._meta.label}.{field.name}: on_delete '
+                f'{relation.on_delete.__name__} не поддерживается'
+            )
+    deleted[queryset.model._meta.label] += queryset._raw_delete(queryset.db)
+    if top:
+        for field, pks in restricted:
+            left = field.model._base_manager.filter(pk__in=pks)
+            if left.exists():
+                raise models.RestrictedError(
+                    f'Удаление запрещено ссылками из '
+                    f'{field.model._meta.label}.{field.name}',
+                    set(left[:10]),
+                )
+
+
+def remove_unused_images(names):
+    """Удаляет файлы картинок, на которые больше не ссылается ни один
+    рецепт. Одинаковые картинки хранятся одним файлом, поэтому число
+    ссылок считается по столбцу Recipe.image. Файлы моложе
+    UNUSED_IMAGE_MIN_AGE остаются для gc_images: их могли только что
+    загрузить для рецепта, который ещё не закоммичен.
+    """
+    names = {name for name in names if name}
+    used = set(Recipe.objects.filter(image__in=names).values_list(
+        'image', flat=True
+    ))
+    storage = Recipe._meta.get_field('image').storage
+    for name in names - used:
+        storage.delete_unused(name, settings.UNUSED_IMAGE_MIN_AGE)
+
+
+def release_image_on_commit(name):
+    transaction.on_commit(lambda: remove_unused_images([name]))
+
+
+def delete_recipes(queryset, batch_size=1000):
+    """Пакетно удаляет рецепты queryset, затем их картинки.
+
+    Возвращает (Counter удалённых строк по моделям, секунды).
+    """
+    started = time.monotonic()
+    deleted = Counter()
+    queryset = queryset.order_by().values_list('pk', 'image')
+    while True:
+        with transaction.atomic():
+            batch = list(queryset[:batch_size])
+            if not batch:
+                break
+            ids, images = zip(*batch)
+            update_cart_totals(ids, -1)
+            delete_queryset(Recipe._base_manager.filter(pk__in=ids), deleted)
+            transaction.on_commit(
+                lambda images=images: remove_unused_images(images)
+            )
+            # Последним шагом: id записи журнала не должен обгонять коммит
+            # больше, чем на CHANGES_SETTLE (см. recipes/changes.py).
+            log_changes(Change.RECIPE, Change.DELETED, ids)
+    return deleted, time.monotonic() - started
+
+
+def delete_user(user, batch_size=1000):
+    started = time.monotonic()
+    deleted, _ = delete_recipes(
+        Recipe.objects.filter(author=user), batch_size
+    )
+    with transaction.atomic():
+        withdraw(Favorite.objects.filter(user=user))
+        withdraw(ShoppingCart.objects.filter(user=user))
+        delete_queryset(type(user)._base_manager.filter(pk=user.pk), deleted)
+    return deleted, time.monotonic() - started
+
+
+def update_cart_totals(recipe_ids, sign, user_id=None):
+    """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов
+    recipe_ids из итогов корзин всех, у кого они в корзине (или только
+    user_id). Вызывается после добавления в корзину и до удаления из неё,
+    в той же транзакции.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if sign > 0 and connection.features.has_select_for_update:
+        # Внешние ключи Django проверяются при коммите, поэтому рецепт
+        # блокируется явно: иначе итоги посчитаются по ингредиентам,
+        # которые параллельно заменяет lock_recipe_carts + update.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT 1 FROM {Recipe._meta.db_table} WHERE id IN '
+                f'({", ".join(["%s"] * len(recipe_ids))}) FOR KEY SHARE',
+                recipe_ids
+            )
+    totals = CartIngredientTotal._meta.db_table
+    params = [sign, *recipe_ids]
+    user_filter = ''
+    if user_id is not None:
+        user_filter = 'AND cart.user_id = %s'
+        params.append(user_id)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {totals} (user_id, ingredient_id, total)
+            SELECT cart.user_id, item.ingredient_id, %s * SUM(item.amount)
+            FROM {ShoppingCart._meta.db_table} cart
+            JOIN {RecipeIngredient._meta.db_table} item
+                ON item.recipe_id = cart.recipe_id
+            WHERE cart.recipe_id IN ({', '.join(['%s'] * len(recipe_ids))})
+                {user_filter}
+            GROUP BY cart.user_id, item.ingredient_id
+            ON CONFLICT (user_id, ingredient_id)
+            DO UPDATE SET total = {totals}.total + EXCLUDED.total
+            """,
+            params
+        )
+    if sign < 0:
+        carts = ShoppingCart.objects.filter(recipe_id__in=recipe_ids)
+        if user_id is not None:
+            carts = carts.filter(user_id=user_id)
+        CartIngredientTotal.objects.filter(
+            user_id__in=carts.values('user_id'), total__lte=0
+        ).delete()
+
+
+def lock_recipe_carts(recipe_id):
+    """Блокирует рецепт и строки корзин с ним до конца транзакции.
+
+    Нужно перед заменой ингредиентов рецепта: блокировка строк корзин не
+    даёт убрать рецепт из корзины, а блокировка рецепта — посчитать итоги
+    новой строки корзины (update_cart_totals берёт FOR KEY SHARE), пока
+    итоги корзин пересчитываются.
+    """
+    list(Recipe.objects.select_for_update().filter(pk=recipe_id).values_list(
+        'pk', flat=True
+    ))
+    list(ShoppingCart.objects.select_for_update().filter(
+        recipe_id=recipe_id
+    ).values_list('pk', flat=True))
+
+
+def cart_totals_from_cart(user_ids=None):
+    """Итоги корзин, посчитанные заново по ShoppingCart."""
+    lookup = {'recipe__shopping_cart__isnull': False}
+    if user_ids is not None:
+        lookup = {'recipe__shopping_cart__user_id__in': user_ids}
+    items = RecipeIngredient.objects.filter(**lookup)
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in items.order_by().values(
+            'recipe__shopping_cart__user_id', 'ingredient_id'
+        ).annotate(total=models.Sum('amount')).values_list(
+            'recipe__shopping_cart__user_id', 'ingredient_id', 'total'
+        )
+    }
+
+
+@transaction.atomic
+def rebuild_cart_totals(user_ids):
+    CartIngredientTotal.objects.filter(user_id__in=user_ids).delete()
+    CartIngredientTotal.objects.bulk_create(
+        (
+            CartIngredientTotal(
+                user_id=user_id, ingredient_id=ingredient_id, total=total
+            )
+            for (user_id, ingredient_id), total
+            in cart_totals_from_cart(user_ids).items()
+        ),
+        batch_size=5000
+    )
+
+
+def insert_ignore(model, target_field, target_id, **values):
+    """Одним запросом добавляет строку model, если объект target_id
+    существует и такой строки ещё нет:
+
+        INSERT ... SELECT ... FROM target WHERE pk = %s
+        ON CONFLICT DO NOTHING RETURNING id
+
+    Возвращает id новой строки или None.
+    """
+    qn = connection.ops.quote_name
+    target = model._meta.get_field(target_field)
+    target_meta = target.related_model._meta
+    fields = [model._meta.get_field(name) for name in values]
+    columns = ', '.join(qn(field.column) for field in [*fields, target])
+    params = [
+        field.get_db_prep_save(values[field.name], connection)
+        for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(model._meta.db_table)} ({columns}) '
+            f'SELECT {"%s, " * len(fields)}{qn(target_meta.pk.column)} '
+            f'FROM {qn(target_meta.db_table)} '
+            f'WHERE {qn(target_meta.pk.column)} = %s '
+            f'ON CONFLICT DO NOTHING RETURNING {qn(model._meta.pk.column)}',
+            [*params, target_id]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
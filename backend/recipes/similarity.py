@@ -0,0 +1,121 @@
+"""Похожие рецепты: MinHash-подписи по ингредиентам и тегам + LSH.
+
+Подпись из NUM_PERM минимумов хешей делится на BANDS полос; рецепты,
+совпавшие хотя бы в одной полосе, становятся кандидатами, а доля
+совпавших позиций подписи оценивает коэффициент Жаккара.
+"""
+from collections import defaultdict
+from itertools import chain
+
+import numpy as np
+from django.db.models import Count, Q
+
+from .models import Recipe, RecipeIngredient, RecipeSketch, RecipeSketchBand
+
+NUM_PERM = 64
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+PRIME = (1 << 31) - 1
+CANDIDATES = 200
+
+_random = np.random.default_rng(20240620)
+_A = _random.integers(1, PRIME, NUM_PERM, dtype=np.uint64)
+_B = _random.integers(0, PRIME, NUM_PERM, dtype=np.uint64)
+_BAND_MULTIPLIER = np.uint64(0x100000001B3)
+
+
+def recipe_features(recipe_ids):
+    # Ингредиенты кодируются чётными числами, теги — нечётными.
+    features = defaultdict(list)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by().values_list('recipe_id', 'ingredient_id'):
+        features[recipe_id].append(ingredient_id * 2)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'tag_id'):
+        features[recipe_id].append(tag_id * 2 + 1)
+    return [features[recipe_id] for recipe_id in recipe_ids]
+
+
+def signatures(feature_lists):
+    lengths = np.fromiter(
+        (len(features) for features in feature_lists),
+        dtype=np.int64, count=len(feature_lists)
+    )
+    result = np.full((len(feature_lists), NUM_PERM), PRIME, dtype=np.uint64)
+    if lengths.sum():
+        flat = np.fromiter(
+            chain.from_iterable(feature_lists),
+            dtype=np.uint64, count=int(lengths.sum())
+        ) % np.uint64(PRIME)
+        hashed = (_A[:, None] * flat[None, :] + _B[:, None]) % np.uint64(
+            PRIME
+        )
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        filled = lengths > 0
+        result[filled] = np.minimum.reduceat(
+            hashed, offsets[filled], axis=1
+        ).T
+    return result.astype('<u4')
+
+
+def band_buckets(signature_matrix):
+    bands = signature_matrix.reshape(
+        len(signature_matrix), BANDS, ROWS
+    ).astype(np.uint64)
+    buckets = np.zeros((len(signature_matrix), BANDS), dtype=np.uint64)
+    for row in range(ROWS):
+        buckets = buckets * _BAND_MULTIPLIER + bands[:, :, row]
+    return buckets.view(np.int64)
+
+
+def store_sketches(recipe_ids):
+    """Пересчитывает подписи и полосы LSH для рецептов recipe_ids."""
+    recipe_ids = list(recipe_ids)
+    signature_matrix = signatures(recipe_features(recipe_ids))
+    buckets = band_buckets(signature_matrix)
+    RecipeSketchBand.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeSketch.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeSketch.objects.bulk_create(
+        RecipeSketch(recipe_id=recipe_id, signature=signature.tobytes())
+        for recipe_id, signature in zip(recipe_ids, signature_matrix)
+    )
+    RecipeSketchBand.objects.bulk_create(
+        (
+            RecipeSketchBand(recipe_id=recipe_id, band=band, bucket=bucket)
+            for recipe_id, row in zip(recipe_ids, buckets.tolist())
+            for band, bucket in enumerate(row)
+        ),
+        batch_size=5000
+    )
+
+
+def similar_recipe_ids(recipe_id, limit):
+    """Возвращает [(id, оценка Жаккара)] наиболее похожих рецептов."""
+    sketch = RecipeSketch.objects.filter(recipe_id=recipe_id).first()
+    if sketch is None:
+        store_sketches([recipe_id])
+        sketch = RecipeSketch.objects.get(recipe_id=recipe_id)
+    target = np.frombuffer(bytes(sketch.signature), dtype='<u4')
+    query = Q()
+    for band, bucket in enumerate(band_buckets(target[None, :])[0].tolist()):
+        query |= Q(band=band, bucket=bucket)
+    candidates = list(
+        RecipeSketchBand.objects.filter(query).exclude(
+            recipe_id=recipe_id
+        ).values('recipe_id').annotate(
+            hits=Count('id')
+        ).order_by('-hits').values_list('recipe_id', flat=True)[:CANDIDATES]
+    )
+    if not candidates:
+        return []
+    rows = list(RecipeSketch.objects.filter(
+        recipe_id__in=candidates
+    ).values_list('recipe_id', 'signature'))
+    matrix = np.stack([
+        np.frombuffer(bytes(signature), dtype='<u4') for _, signature in rows
+    ])
+    scores = (matrix == target).mean(axis=1)
+    order = np.argsort(-scores, kind='stable')[:limit]
+    return [(rows[index][0], float(scores[index])) for index in order]
@@ -0,0 +1,71 @@
+import fcntl
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл под именем из sha256 содержимого.
+
+    Повторная загрузка той же картинки не пишет на диск ничего нового,
+    а возвращает имя уже существующего файла, обновив его mtime: файл,
+    на который вот-вот сошлётся незакоммиченный рецепт, выглядит свежим
+    и не удаляется delete_unused. Проверка и удаление идут под
+    файловой блокировкой, общей для всех процессов.
+    """
+
+    lock_name = '.images.lock'
+
+    def __init__(self, prefix='recipes', **kwargs):
+        self.prefix = prefix
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return f'{self.prefix}/{digest[:2]}/{digest}{extension}'
+
+    @contextmanager
+    def locked(self):
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, self.lock_name), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        with self.locked():
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+            return super()._save(name, content)
+
+    def delete_unused(self, name, min_age):
+        """Удаляет файл, если он не трогался min_age секунд.
+
+        Ссылки на файл вызывающий проверяет до вызова; свежий mtime
+        значит, что новая ссылка могла ещё не закоммититься.
+        """
+        with self.locked():
+            try:
+                modified = os.stat(self.path(name)).st_mtime
+            except FileNotFoundError:
+                return False
+            if time.time() - modified < min_age:
+                return False
+            os.remove(self.path(name))
+            return True
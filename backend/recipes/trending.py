@@ -0,0 +1,156 @@
+"""Популярность рецептов с экспоненциальным затуханием.
+
+Вклад события весом w в момент t хранится как w * 2 ** ((t - epoch) / T),
+где T — период полураспада. Порядок по такому рейтингу совпадает с порядком
+по затухающему рейтингу в любой момент, поэтому старые строки не нужно
+пересчитывать: обновление добавляет только новые события. Когда показатель
+степени становится слишком большим, точка отсчёта сдвигается и все рейтинги
+масштабируются одним UPDATE.
+
+Отметка — id последнего учтённого события. Строка с меньшим id может
+закоммититься позже строки с большим, поэтому события моложе
+TRENDING_SETTLE секунд ждут следующего запуска (как в changes.py).
+
+При удалении уже учтённой строки её вклад вычитается (withdraw), так что
+рейтинг — сумма по строкам, которые есть сейчас: повторное добавление и
+удаление одним пользователем его не накручивает.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Favorite, ShoppingCart, TrendingScore, TrendingState
+
+MAX_EXPONENT = 256
+MIN_SCORE = 1e-6
+
+
+def event_weight(created_at, epoch, weight):
+    elapsed = (created_at - epoch).total_seconds()
+    return weight * 2 ** (elapsed / settings.TRENDING_HALF_LIFE)
+
+
+def rebase(state, now):
+    elapsed = (now - state.epoch).total_seconds()
+    if elapsed / settings.TRENDING_HALF_LIFE < MAX_EXPONENT:
+        return
+    TrendingScore.objects.update(
+        score=F('score') * 2 ** (-elapsed / settings.TRENDING_HALF_LIFE)
+    )
+    TrendingScore.objects.filter(score__lt=MIN_SCORE).delete()
+    state.epoch = now
+
+
+def add_scores(scores):
+    existing = TrendingScore.objects.filter(
+        recipe_id__in=list(scores)
+    ).values_list('recipe_id', 'score')
+    for recipe_id, score in existing:
+        scores[recipe_id] += score
+    TrendingScore.objects.bulk_create(
+        [
+            TrendingScore(recipe_id=recipe_id, score=score)
+            for recipe_id, score in scores.items()
+        ],
+        update_conflicts=True,
+        unique_fields=('recipe',),
+        update_fields=('score',),
+    )
+
+
+def consume(model, last_id, epoch, weight, batch_size, settled):
+    """Добавляет события model с id > last_id, созданные до settled,
+    возвращает новую отметку.
+    """
+    while True:
+        events = list(
+            model.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'recipe_id', 'created_at'
+            )[:batch_size]
+        )
+        # Отметка не перепрыгивает несвежее событие, даже если за ним
+        # по id идут более старые.
+        for position, (_, _, created_at) in enumerate(events):
+            if created_at >= settled:
+                events = events[:position]
+                break
+        if not events:
+            return last_id
+        scores = Counter()
+        for _, recipe_id, created_at in events:
+            scores[recipe_id] += event_weight(created_at, epoch, weight)
+        add_scores(scores)
+        last_id = events[-1][0]
+
+
+def share_state():
+    """Читает состояние под FOR KEY SHARE: refresh_trending (FOR UPDATE)
+    ждёт, пока транзакция не закоммитит удаление, а удаления друг друга
+    не блокируют.
+    """
+    table = TrendingState._meta.db_table
+    lock = ''
+    if connection.features.has_select_for_update:
+        lock = ' FOR KEY SHARE'
+    states = list(TrendingState.objects.raw(
+        f'SELECT * FROM {table} WHERE id = %s{lock}', [1]
+    ))
+    return states[0] if states else None
+
+
+def withdraw(queryset):
+    """Вычитает из рейтингов вклад строк queryset (Favorite или
+    ShoppingCart), которые refresh_trending уже учёл. Вызывать до удаления
+    строк, в той же транзакции.
+    """
+    state = share_state()
+    if state is None:
+        return
+    if queryset.model is Favorite:
+        last_id = state.last_favorite_id
+        weight = settings.TRENDING_WEIGHTS['favorite']
+    else:
+        last_id = state.last_shopping_cart_id
+        weight = settings.TRENDING_WEIGHTS['shopping_cart']
+    # Строки блокируются, чтобы параллельное удаление той же строки не
+    # вычло её вклад второй раз.
+    rows = queryset.filter(id__lte=last_id).select_for_update().values_list(
+        'recipe_id', 'created_at'
+    )
+    scores = Counter()
+    for recipe_id, created_at in rows:
+        scores[recipe_id] += event_weight(created_at, state.epoch, weight)
+    for recipe_id, score in scores.items():
+        TrendingScore.objects.filter(recipe_id=recipe_id).update(
+            score=F('score') - score
+        )
+    TrendingScore.objects.filter(
+        recipe_id__in=list(scores), score__lt=MIN_SCORE
+    ).delete()
+
+
+@transaction.atomic
+def refresh_trending(batch_size=10000):
+    """Учитывает события, появившиеся после прошлого запуска."""
+    now = timezone.now()
+    state = TrendingState.objects.select_for_update().filter(pk=1).first()
+    if state is None:
+        state = TrendingState.objects.create(pk=1, epoch=now)
+    rebase(state, now)
+    weights = settings.TRENDING_WEIGHTS
+    settled = now - timedelta(seconds=settings.TRENDING_SETTLE)
+    state.last_favorite_id = consume(
+        Favorite, state.last_favorite_id, state.epoch,
+        weights['favorite'], batch_size, settled
+    )
+    state.last_shopping_cart_id = consume(
+        ShoppingCart, state.last_shopping_cart_id, state.epoch,
+        weights['shopping_cart'], batch_size, settled
+    )
+    state.refreshed_at = now
+    state.save()
+    return state
@@ -0,0 +1,85 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from PIL import Image
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+# Ведро, которое в тестах не кончается.
+NO_THROTTLE = {
+    'user': (1000000.0, 1000000),
+    'anon': (1000000.0, 1000000),
+    'lease': 5,
+    'leases': 10000,
+    'cache': 'default',
+    'timeout': 60,
+}
+
+
+def png(color=(255, 0, 0)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 2), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(
+        email=extra.pop('email', f'{username}@example.com'),
+        username=username,
+        first_name=extra.pop('first_name', 'Имя'),
+        last_name=extra.pop('last_name', 'Фамилия'),
+        password='password',
+        **extra,
+    )
+
+
+def make_tag(slug):
+    return Tag.objects.create(name=slug.title(), slug=slug, color='#112233')
+
+
+def make_ingredient(name, unit='г'):
+    return Ingredient.objects.create(name=name, measurement_unit=unit)
+
+
+def make_recipe(author, name, tags=(), ingredients=(), image=None):
+    recipe = Recipe(author=author, name=name, text='текст', cooking_time=5)
+    recipe.image.save('recipe.png', ContentFile(image or png()), save=False)
+    recipe.save()
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients
+    )
+    return recipe
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+class TempMediaMixin:
+    """Картинки рецептов пишутся во временный MEDIA_ROOT класса."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(
+            MEDIA_ROOT=cls._media_root, THROTTLE=NO_THROTTLE
+        )
+        cls._media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
@@ -0,0 +1,175 @@
+import unittest
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from recipes.models import CartIngredientTotal, Favorite, ShoppingCart
+from recipes.services import cart_totals_from_cart, update_cart_totals
+from users.models import Subscription
+
+from .fixtures import (TempMediaMixin, make_ingredient, make_recipe,
+                       make_tag, make_user)
+
+# Postgres: сессия, пользователь, оценка числа строк (reltuples, EXPLAIN),
+# COUNT под порогом и строки страницы; у рецептов ещё теги для фильтра.
+CHANGELIST_QUERIES = {
+    'admin:recipes_recipe_changelist': 7,
+    'admin:recipes_shoppingcart_changelist': 6,
+    'admin:users_subscription_changelist': 6,
+    'admin:users_user_changelist': 6,
+}
+
+
+class AdminChangelistQueriesTest(TempMediaMixin, TestCase):
+    """Число запросов страницы списка не зависит от числа строк."""
+
+    def setUp(self):
+        self.admin = make_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        self.tags = [make_tag('soup'), make_tag('salad')]
+        self.ingredient = make_ingredient('соль')
+        self.users = []
+        self.recipes = []
+
+    def grow(self, size):
+        for _ in range(size):
+            number = len(self.users)
+            user = make_user(f'user{number}')
+            recipe = make_recipe(
+                user, f'рецепт {number}', tags=self.tags,
+                ingredients=[(self.ingredient, 1)],
+            )
+            Favorite.objects.create(user=self.admin, recipe=recipe)
+            ShoppingCart.objects.create(user=self.admin, recipe=recipe)
+            Subscription.objects.create(subscriber=self.admin, user=user)
+            for previous in self.users[-3:]:
+                Subscription.objects.create(subscriber=previous, user=user)
+            self.users.append(user)
+            self.recipes.append(recipe)
+
+    def count_queries(self):
+        counts = {}
+        for url_name in CHANGELIST_QUERIES:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 200)
+            counts[url_name] = len(queries)
+        return counts
+
+    def test_query_count_is_constant(self):
+        self.grow(3)
+        small = self.count_queries()
+        self.grow(30)
+        self.assertEqual(self.count_queries(), small)
+
+    @unittest.skipUnless(
+        connection.vendor == 'postgresql', 'оценка числа строк есть в Postgres'
+    )
+    def test_query_count(self):
+        self.grow(3)
+        self.assertEqual(self.count_queries(), CHANGELIST_QUERIES)
+
+    def test_search_and_filters(self):
+        self.grow(3)
+        changelist = reverse('admin:recipes_recipe_changelist')
+        response = self.client.get(changelist, {'q': '"рецепт 1"'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.recipes[1]]
+        )
+        response = self.client.get(
+            changelist, {'author__username': 'user2'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.recipes[2]]
+        )
+        response = self.client.get(
+            reverse('admin:users_user_changelist'), {'q': 'user0@example.com'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.users[0]]
+        )
+
+
+class AdminCartTotalsTest(TempMediaMixin, TestCase):
+    """Изменения корзин через админку не расходятся с итогами."""
+
+    def setUp(self):
+        self.admin = make_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(self.admin)
+        self.author = make_user('author')
+        self.users = [make_user(f'user{number}') for number in range(2)]
+        salt, sugar = make_ingredient('соль'), make_ingredient('сахар')
+        self.recipes = [
+            make_recipe(self.author, 'суп', ingredients=[(salt, 2)]),
+            make_recipe(
+                self.author, 'чай', ingredients=[(salt, 1), (sugar, 3)]
+            ),
+            make_recipe(self.users[1], 'каша', ingredients=[(sugar, 5)]),
+        ]
+        for user in self.users + [self.author]:
+            for recipe in self.recipes:
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+                update_cart_totals([recipe.pk], 1, user.pk)
+
+    def assertTotalsMatch(self):
+        totals = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in CartIngredientTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total'
+            )
+        }
+        self.assertEqual(totals, cart_totals_from_cart())
+
+    def test_shopping_cart(self):
+        cart = ShoppingCart.objects.get(
+            user=self.users[0], recipe=self.recipes[0]
+        )
+        response = self.client.post(
+            reverse('admin:recipes_shoppingcart_delete', args=[cart.pk]),
+            {'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTotalsMatch()
+        response = self.client.post(
+            reverse('admin:recipes_shoppingcart_add'),
+            {'user': self.users[0].pk, 'recipe': self.recipes[0].pk},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTotalsMatch()
+        carts = ShoppingCart.objects.filter(recipe=self.recipes[1])
+        response = self.client.post(
+            reverse('admin:recipes_shoppingcart_changelist'), {
+                'action': 'delete_selected',
+                '_selected_action': list(carts.values_list('pk', flat=True)),
+                'post': 'yes',
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(carts.exists())
+        self.assertTotalsMatch()
+
+    def test_recipe_and_user(self):
+        response = self.client.post(
+            reverse('admin:recipes_recipe_delete', args=[self.recipes[0].pk]),
+            {'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTotalsMatch()
+        response = self.client.post(
+            reverse('admin:recipes_recipe_changelist'), {
+                'action': 'delete_selected',
+                '_selected_action': [self.recipes[1].pk],
+                'post': 'yes',
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTotalsMatch()
+        response = self.client.post(
+            reverse('admin:users_user_delete', args=[self.users[1].pk]),
+            {'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertFalse(CartIngredientTotal.objects.exists())
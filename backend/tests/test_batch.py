@@ -0,0 +1,65 @@
+from django.test import TestCase, override_settings
+from jobs.models import Job
+from recipes.models import Favorite
+
+from .fixtures import TempMediaMixin, client_for, make_recipe, make_user
+
+URL = '/api/batch/'
+
+
+class BatchViewTest(TempMediaMixin, TestCase):
+    """Каждый подзапрос batch проверяет права сам."""
+
+    def setUp(self):
+        self.user = make_user('user')
+        self.other = make_user('other')
+        self.recipe = make_recipe(self.other, 'рецепт')
+
+    def batch(self, client, urls):
+        response = client.post(URL, {'requests': urls}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.json()]
+
+    def test_anonymous(self):
+        self.assertEqual(
+            self.batch(client_for(), [
+                f'/api/recipes/{self.recipe.pk}/',
+                '/api/users/me/',
+                '/api/jobs/',
+            ]),
+            [200, 401, 401],
+        )
+
+    def test_foreign_objects(self):
+        own = Job.objects.create(name='noop', user=self.user)
+        foreign = Job.objects.create(name='noop', user=self.other)
+        self.assertEqual(
+            self.batch(client_for(self.user), [
+                '/api/users/me/',
+                f'/api/jobs/{own.pk}/',
+                f'/api/jobs/{foreign.pk}/',
+            ]),
+            [200, 200, 404],
+        )
+
+    def test_non_get_endpoint(self):
+        statuses = self.batch(client_for(self.user), [
+            f'/api/recipes/{self.recipe.pk}/favorite/',
+            '/api/events/ticket/',
+            '/api/batch/',
+            '/admin/',
+        ])
+        self.assertEqual(statuses, [405, 405, 400, 400])
+        self.assertFalse(Favorite.objects.exists())
+
+    @override_settings(BATCH_MAX_REQUESTS=3)
+    def test_size_limit(self):
+        client = client_for(self.user)
+        urls = ['/api/users/me/'] * 3
+        self.assertEqual(self.batch(client, urls), [200] * 3)
+        response = client.post(
+            URL, {'requests': urls + urls[:1]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = client.post(URL, {'requests': []}, format='json')
+        self.assertEqual(response.status_code, 400)
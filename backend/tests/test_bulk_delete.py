@@ -0,0 +1,152 @@
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import models, router, transaction
+from django.db.models.deletion import Collector
+from django.test import TestCase
+from recipes import services
+from recipes.feed import fan_out
+from recipes.models import (Change, Favorite, Recipe, ShoppingCart,
+                            TrendingScore)
+from recipes.services import delete_queryset, delete_user, update_cart_totals
+from users.models import Subscription
+
+from .fixtures import (TempMediaMixin, make_ingredient, make_recipe,
+                       make_tag, make_user)
+
+User = get_user_model()
+
+
+def collector_counts(objects):
+    collector = Collector(using=router.db_for_write(type(objects[0])))
+    collector.collect(objects)
+    # Одна строка может попасть в несколько быстрых удалений по разным
+    # внешним ключам, поэтому считаются различные pk.
+    pks = {}
+    for model, instances in collector.data.items():
+        pks.setdefault(model._meta.label, set()).update(
+            instance.pk for instance in instances
+        )
+    for queryset in collector.fast_deletes:
+        pks.setdefault(queryset.model._meta.label, set()).update(
+            queryset.values_list('pk', flat=True)
+        )
+    return {label: len(values) for label, values in pks.items() if values}
+
+
+def with_on_delete(model, related_model, on_delete):
+    """Подменяет on_delete одной связи, чтобы проверить PROTECT/RESTRICT
+    без моделей с такими связями.
+    """
+    original = services._dependent_relations
+
+    def relations(current):
+        return [
+            SimpleNamespace(
+                field=relation.field, related_model=related_model,
+                on_delete=on_delete,
+            )
+            if current is model and relation.related_model is related_model
+            else relation
+            for relation in original(current)
+        ]
+
+    return mock.patch.object(services, '_dependent_relations', relations)
+
+
+class DeleteQuerysetTest(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        self.author = make_user('author')
+        self.reader = make_user('reader')
+        tag = make_tag('soup')
+        ingredient = make_ingredient('свёкла')
+        self.recipes = [
+            make_recipe(self.author, f'рецепт {number}', tags=[tag],
+                        ingredients=[(ingredient, number + 1)])
+            for number in range(3)
+        ]
+        other = make_recipe(self.reader, 'чужой', ingredients=[
+            (ingredient, 5),
+        ])
+        Subscription.objects.create(subscriber=self.reader, user=self.author)
+        Subscription.objects.create(subscriber=self.author, user=self.reader)
+        for recipe in self.recipes:
+            fan_out(recipe)
+            Favorite.objects.create(user=self.reader, recipe=recipe)
+            ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+            TrendingScore.objects.create(recipe=recipe, score=1)
+        Favorite.objects.create(user=self.author, recipe=other)
+        ShoppingCart.objects.create(user=self.author, recipe=other)
+        update_cart_totals(
+            [recipe.pk for recipe in self.recipes] + [other.pk], 1
+        )
+        Change.objects.create(
+            kind=Change.FAVORITE, action=Change.ADDED, object_id=other.pk,
+            user=self.author,
+        )
+
+    def test_delete_user_matches_collector(self):
+        expected = collector_counts([self.author])
+        deleted, _ = delete_user(self.author, batch_size=2)
+        self.assertEqual(dict(+deleted), expected)
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertTrue(User.objects.filter(pk=self.reader.pk).exists())
+
+    def test_protect(self):
+        with with_on_delete(Recipe, Favorite, models.PROTECT):
+            with self.assertRaises(models.ProtectedError):
+                with transaction.atomic():
+                    delete_queryset(
+                        User.objects.filter(pk=self.author.pk), Counter()
+                    )
+        self.assertEqual(Recipe.objects.filter(author=self.author).count(), 3)
+
+    def test_restrict(self):
+        with with_on_delete(Recipe, Favorite, models.RESTRICT):
+            with self.assertRaises(models.RestrictedError):
+                with transaction.atomic():
+                    delete_queryset(
+                        User.objects.filter(pk=self.author.pk), Counter()
+                    )
+            self.assertEqual(Favorite.objects.count(), 4)
+            # Избранное самого удаляемого уходит каскадом по user: можно.
+            Favorite.objects.filter(user=self.reader).delete()
+            Favorite.objects.create(user=self.author, recipe=self.recipes[0])
+            with transaction.atomic():
+                delete_queryset(
+                    User.objects.filter(pk=self.author.pk), Counter()
+                )
+        self.assertFalse(Recipe.objects.filter(author=self.author).exists())
+
+    def test_unsupported_on_delete(self):
+        with with_on_delete(Recipe, Favorite, models.SET(None)):
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    delete_queryset(
+                        Recipe.objects.filter(author=self.author), Counter()
+                    )
+
+
+class BulkDeleteActionTest(TempMediaMixin, TestCase):
+
+    def test_admin_actions(self):
+        admin = make_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        author = make_user('author')
+        recipes = [make_recipe(author, f'рецепт {n}') for n in range(2)]
+        response = self.client.post(
+            '/admin/recipes/recipe/',
+            {'action': 'bulk_delete', '_selected_action': [recipes[0].pk]},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Recipe.objects.all()), [recipes[1]])
+        response = self.client.post(
+            '/admin/users/user/',
+            {'action': 'bulk_delete', '_selected_action': [author.pk]},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(list(User.objects.all()), [admin])
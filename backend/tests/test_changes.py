@@ -0,0 +1,46 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Change, Recipe
+from recipes.services import delete_recipes
+
+from .fixtures import TempMediaMixin, make_recipe, make_user
+
+
+class DeleteRecipesChangesTest(TempMediaMixin, TestCase):
+    """Записи журнала пишутся в конце каждой транзакции пакета."""
+
+    def test_changes_written_last(self):
+        author = make_user('author')
+        ids = [
+            make_recipe(author, f'рецепт {number}').pk
+            for number in range(3)
+        ]
+        table = Change._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            delete_recipes(Recipe.objects.filter(author=author), 2)
+        statements = [query['sql'] for query in queries]
+        inserts = [
+            index for index, sql in enumerate(statements)
+            if sql.startswith(f'INSERT INTO "{table}"')
+        ]
+        deletes = [
+            index for index, sql in enumerate(statements)
+            if sql.startswith('DELETE')
+        ]
+        self.assertEqual(len(inserts), 2)
+        for insert in inserts:
+            batch = [index for index in deletes if index < insert]
+            self.assertTrue(batch)
+            # Между DELETE пакета и записью в журнал нет других запросов,
+            # кроме закрытия точки сохранения.
+            self.assertFalse([
+                sql for sql in statements[batch[-1] + 1:insert]
+                if not sql.startswith('SAVEPOINT')
+            ])
+        self.assertEqual(
+            sorted(Change.objects.filter(
+                kind=Change.RECIPE, action=Change.DELETED
+            ).values_list('object_id', flat=True)),
+            ids,
+        )
@@ -0,0 +1,106 @@
+import random
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from users.models import Subscription
+
+from .fixtures import (TempMediaMixin, client_for, make_ingredient,
+                       make_recipe, make_tag, make_user, png)
+
+RECIPE_FIELDS = (
+    'id', 'tags', 'author', 'ingredients', 'is_favorited',
+    'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+)
+SUBSCRIPTION_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'is_subscribed',
+    'recipes', 'recipes_count',
+)
+# Символы, на которых расходятся json и orjson, если их не выравнивать.
+ALPHABET = 'abcxyz АБВ ёЁ "\\/\t   🍲<>&\''
+
+
+class FastSerializersMatchDRFTest(TempMediaMixin, TestCase):
+    """На случайных данных ручные представления (FAST_SERIALIZERS=True)
+    совпадают с ответами сериализаторов DRF байт в байт.
+    """
+
+    seeds = range(5)
+
+    def text(self, rng, size=12):
+        return ''.join(rng.choice(ALPHABET) for _ in range(size))
+
+    def populate(self, rng):
+        users = [
+            make_user(f'user{i}', first_name=self.text(rng, 6),
+                      last_name=self.text(rng, 6))
+            for i in range(4)
+        ]
+        tags = [make_tag(f'tag{i}') for i in range(3)]
+        ingredients = [
+            make_ingredient(f'{self.text(rng, 5)}{i}', rng.choice('гмлшт'))
+            for i in range(6)
+        ]
+        for i in range(rng.randint(3, 9)):
+            recipe = make_recipe(
+                rng.choice(users), f'{self.text(rng)}{i}',
+                tags=rng.sample(tags, rng.randint(0, 3)),
+                ingredients=[
+                    (ingredient, rng.randint(1, 500))
+                    for ingredient in rng.sample(
+                        ingredients, rng.randint(1, 4)
+                    )
+                ],
+                image=png((i * 40 % 256, 0, 0)),
+            )
+            recipe.text = self.text(rng, 40)
+            recipe.save()
+            for user in users:
+                if rng.random() < 0.4:
+                    recipe.is_favorited.add(user)
+                if rng.random() < 0.4:
+                    recipe.is_in_shopping_cart.add(user)
+        for subscriber in users:
+            for author in users:
+                if author != subscriber and rng.random() < 0.6:
+                    Subscription.objects.create(
+                        subscriber=subscriber, user=author
+                    )
+        return users
+
+    def urls(self, rng):
+        urls = ['/api/recipes/', '/api/recipes/?view=card',
+                '/api/users/subscriptions/']
+        for _ in range(4):
+            fields = rng.sample(RECIPE_FIELDS, rng.randint(1, 5))
+            urls.append(f'/api/recipes/?fields={",".join(fields)}')
+            fields = rng.sample(SUBSCRIPTION_FIELDS, rng.randint(1, 5))
+            urls.append(
+                f'/api/users/subscriptions/?fields={",".join(fields)}'
+                f'&recipes_limit={rng.randint(1, 3)}'
+            )
+        return urls
+
+    def fetch(self, client, url, fast):
+        cache.clear()
+        with override_settings(FAST_SERIALIZERS=fast):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response.content
+
+    def test_random_data(self):
+        for seed in self.seeds:
+            with self.subTest(seed=seed), transaction.atomic():
+                rng = random.Random(seed)
+                users = self.populate(rng)
+                clients = [client_for(), client_for(rng.choice(users))]
+                for url in self.urls(rng):
+                    for client in clients:
+                        if client is clients[0] and 'subscriptions' in url:
+                            continue
+                        self.assertEqual(
+                            self.fetch(client, url, fast=True),
+                            self.fetch(client, url, fast=False),
+                            url,
+                        )
+                transaction.set_rollback(True)
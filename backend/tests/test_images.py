@@ -0,0 +1,64 @@
+import os
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+from recipes.models import Recipe
+from recipes.services import remove_unused_images
+
+from .fixtures import TempMediaMixin, make_recipe, make_user, png
+
+
+class UnusedImagesTest(TempMediaMixin, TestCase):
+    """Файл, который только что загрузили снова, не удаляется."""
+
+    def setUp(self):
+        self.author = make_user('author')
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def age(self, name, seconds=2 * 60 * 60):
+        past = time.time() - seconds
+        os.utime(self.storage.path(name), (past, past))
+
+    def orphan(self, color):
+        recipe = make_recipe(self.author, f'рецепт {color}', image=png(color))
+        name = recipe.image.name
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        return name
+
+    def test_reuse_touches_file(self):
+        name = self.orphan((0, 0, 255))
+        self.age(name)
+        recipe = make_recipe(self.author, 'снова', image=png((0, 0, 255)))
+        self.assertEqual(recipe.image.name, name)
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        remove_unused_images([name])
+        self.assertTrue(self.storage.exists(name))
+
+    def test_old_orphan_removed(self):
+        name = self.orphan((0, 255, 0))
+        remove_unused_images([name])
+        self.assertTrue(self.storage.exists(name))
+        self.age(name)
+        remove_unused_images([name])
+        self.assertFalse(self.storage.exists(name))
+
+    def test_gc_images(self):
+        fresh = self.orphan((1, 2, 3))
+        old = self.orphan((3, 2, 1))
+        self.age(old)
+        strays = ['photo.jpg', 'images/legacy.png', 'exports/1/list.pdf']
+        for name in strays:
+            path = Path(self.storage.location) / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'x')
+            self.age(name)
+        call_command('gc_images', stdout=StringIO())
+        self.assertTrue(self.storage.exists(fresh))
+        self.assertFalse(self.storage.exists(old))
+        self.assertTrue(self.storage.exists(self.storage.lock_name))
+        # Файлы вне каталога хранилища рецептов не трогаются.
+        for name in strays:
+            self.assertTrue((Path(self.storage.location) / name).exists())
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from recipes.exports import recipe_document
+from recipes.models import Recipe, Tag
+
+from .fixtures import (TempMediaMixin, make_ingredient, make_recipe,
+                       make_tag, make_user)
+
+
+class ImportRecipesTest(TempMediaMixin, TestCase):
+    """Конфликты с уже существующими данными не роняют загрузку."""
+
+    def row(self, name, email='new@example.com', username='new', **extra):
+        return {
+            'name': name,
+            'text': 'текст',
+            'cooking_time': 10,
+            'author': {
+                'email': email, 'username': username,
+                'first_name': 'Имя', 'last_name': 'Фамилия',
+            },
+            'tags': [{'name': 'Суп', 'slug': 'soup', 'color': '#00FF00'}],
+            'ingredients': [
+                {'name': 'яйцо', 'measurement_unit': 'шт', 'amount': 2},
+            ],
+            'image': 'recipes/old.png',
+            **extra,
+        }
+
+    def load(self, *rows):
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix='.jsonl', delete=False, encoding='utf-8'
+        )
+        self.addCleanup(os.remove, file.name)
+        with file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        stderr = StringIO()
+        call_command(
+            'import_recipes', file.name, stdout=StringIO(), stderr=stderr
+        )
+        return stderr.getvalue()
+
+    def test_unit_mismatch_is_reported(self):
+        make_ingredient('яйцо', 'г')
+        warnings = self.load(self.row('омлет'))
+        self.assertIn('омлет', warnings)
+        self.assertIn('шт вместо г', warnings)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_username_clash_renames_author(self):
+        make_user('new', email='old@example.com')
+        make_user('new_2', email='other@example.com')
+        warnings = self.load(self.row('омлет'))
+        recipe = Recipe.objects.select_related('author').get()
+        self.assertEqual(recipe.author.email, 'new@example.com')
+        self.assertEqual(recipe.author.username, 'new_3')
+        self.assertIn('new_3', warnings)
+
+    def test_tags_keep_exported_name(self):
+        Tag.objects.create(name='Суп', slug='breakfast')
+        self.load(self.row('омлет'))
+        tag = Tag.objects.get(slug='soup')
+        self.assertEqual(tag.name, 'Суп (soup)')
+        self.assertEqual(tag.color, '#00FF00')
+
+    def test_round_trip(self):
+        author = make_user('author')
+        tag = make_tag('salad')
+        recipe = make_recipe(
+            author, 'салат', tags=[tag],
+            ingredients=[(make_ingredient('огурец', 'шт'), 3)],
+        )
+        recipe = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'recipe_ingredients__ingredient'
+        ).get()
+        document = recipe_document(recipe)
+        Recipe.objects.all().delete()
+        Tag.objects.all().delete()
+        self.assertEqual(self.load(document), '')
+        imported = Recipe.objects.get()
+        self.assertEqual(imported.author, author)
+        self.assertEqual(
+            list(imported.tags.values_list('name', 'slug')),
+            [('Salad', 'salad')],
+        )
+        self.assertEqual(
+            list(imported.recipe_ingredients.values_list(
+                'ingredient__name', 'amount'
+            )),
+            [('огурец', 3)],
+        )
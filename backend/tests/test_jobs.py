@@ -0,0 +1,85 @@
+import threading
+import unittest
+from datetime import timedelta
+
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from jobs.models import Job
+from jobs.services import claim, requeue_stale, run
+
+JOBS = {
+    'noop': {
+        'task': 'tests.test_jobs.noop',
+        'concurrency': 2,
+        'max_attempts': 2,
+    },
+}
+
+
+def noop(job):
+    pass
+
+
+@override_settings(JOBS=JOBS)
+class RequeueStaleTest(TestCase):
+
+    def running(self, attempts, silent_for):
+        return Job.objects.create(
+            name='noop', status=Job.RUNNING, attempts=attempts, worker='w',
+            heartbeat_at=timezone.now() - timedelta(seconds=silent_for),
+        )
+
+    def test_alive_job_is_left_alone(self):
+        job = self.running(attempts=1, silent_for=5)
+        requeue_stale()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+
+    def test_silent_job_is_requeued(self):
+        job = self.running(attempts=1, silent_for=3600)
+        self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.PENDING, ''))
+
+    def test_silent_job_out_of_attempts_fails(self):
+        job = self.running(attempts=2, silent_for=3600)
+        requeue_stale()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_requeued_job_result_is_not_overwritten(self):
+        job = self.running(attempts=1, silent_for=0)
+        Job.objects.filter(pk=job.pk).update(worker='other')
+        run(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.RUNNING, 'other'))
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'нужны параллельные транзакции'
+)
+@override_settings(JOBS=JOBS)
+class ClaimConcurrencyTest(TransactionTestCase):
+
+    def test_concurrency_limit_holds_under_parallel_claims(self):
+        Job.objects.bulk_create(Job(name='noop') for _ in range(10))
+        barrier = threading.Barrier(8)
+
+        def worker(number):
+            try:
+                barrier.wait()
+                claim(f'worker-{number}')
+            finally:
+                connections.close_all()
+
+        workers = [
+            threading.Thread(target=worker, args=(number,))
+            for number in range(8)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING).count(), 2)
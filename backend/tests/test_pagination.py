@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.core.paginator import EmptyPage
+from api.pagination import EstimatedLimitOffsetPagination
+from django.test import TestCase, override_settings
+from foodgram.paginators import EstimatedCountPaginator
+from recipes.models import Tag
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .fixtures import make_tag
+
+
+@override_settings(ESTIMATED_COUNT_THRESHOLD=2)
+class EstimatedCountPaginatorTest(TestCase):
+    """Ошибка оценки не ломает хвост списка."""
+
+    def setUp(self):
+        for number in range(7):
+            make_tag(f'tag{number}')
+        self.queryset = Tag.objects.order_by('pk')
+
+    def paginator(self, estimate):
+        patcher = mock.patch(
+            'foodgram.paginators.estimated_count', return_value=estimate
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return EstimatedCountPaginator(self.queryset, 3)
+
+    def test_underestimate_serves_tail_page(self):
+        paginator = self.paginator(3)
+        page = paginator.page(3)
+        self.assertEqual(len(page.object_list), 1)
+        self.assertEqual(paginator.count, 7)
+        self.assertFalse(paginator.count_estimated)
+        self.assertFalse(page.has_next())
+
+    def test_underestimate_full_page_keeps_estimate(self):
+        paginator = self.paginator(5)
+        page = paginator.page(2)
+        self.assertEqual(len(page.object_list), 3)
+        self.assertEqual(paginator.count, 7)
+        self.assertTrue(page.has_next())
+
+    def test_overestimate_trims_pages(self):
+        paginator = self.paginator(100)
+        page = paginator.page(3)
+        self.assertEqual(paginator.count, 7)
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertFalse(page.has_next())
+
+    def test_overestimate_missing_page(self):
+        paginator = self.paginator(100)
+        with self.assertRaises(EmptyPage):
+            paginator.page(10)
+        self.assertEqual(paginator.count, 7)
+
+
+@override_settings(ESTIMATED_COUNT_THRESHOLD=2)
+class EstimatedLimitOffsetPaginationTest(TestCase):
+    """next появляется и пропадает по реальным строкам, а не по оценке."""
+
+    def setUp(self):
+        for number in range(7):
+            make_tag(f'tag{number}')
+        self.queryset = Tag.objects.order_by('pk')
+
+    def paginate(self, estimate, offset):
+        request = Request(APIRequestFactory().get(
+            '/', {'limit': 3, 'offset': offset}
+        ))
+        pagination = EstimatedLimitOffsetPagination()
+        with mock.patch(
+            'foodgram.paginators.estimated_count', return_value=estimate
+        ):
+            rows = pagination.paginate_queryset(self.queryset, request)
+        return pagination, rows
+
+    def test_underestimate(self):
+        pagination, rows = self.paginate(3, 3)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(pagination.count, 7)
+        self.assertIsNotNone(pagination.get_next_link())
+        pagination, rows = self.paginate(3, 6)
+        self.assertEqual(len(rows), 1)
+        self.assertIsNone(pagination.get_next_link())
+
+    def test_overestimate(self):
+        pagination, rows = self.paginate(100, 6)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(pagination.count, 7)
+        self.assertIsNone(pagination.get_next_link())
+        pagination, rows = self.paginate(100, 30)
+        self.assertEqual(rows, [])
+        self.assertEqual(pagination.count, 7)
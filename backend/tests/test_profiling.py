@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from .fixtures import NO_THROTTLE, make_user
+
+
+class ProfileReportTest(TestCase):
+    """Отчёт профилировщика читается с диска любым процессом."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        override = override_settings(
+            PROFILING_ENABLED=True, PROFILING_DIR=self.directory,
+            THROTTLE=NO_THROTTLE,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        token = Token.objects.create(user=make_user('admin', is_staff=True))
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+
+    def profile(self):
+        response = self.client.get('/api/tags/', {'profile': 1})
+        self.assertEqual(response.status_code, 200)
+        return response['X-Profile-Id']
+
+    def test_report_on_disk(self):
+        report_id = self.profile()
+        self.assertEqual(
+            os.listdir(self.directory), [f'{report_id}.txt']
+        )
+        response = self.client.get(f'/api/debug/profiles/{report_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'GET /api/tags/?profile=1', response.content)
+
+    def test_expired_and_invalid_reports(self):
+        report_id = self.profile()
+        path = os.path.join(self.directory, f'{report_id}.txt')
+        past = time.time() - 2 * 60 * 60
+        os.utime(path, (past, past))
+        for name in (report_id, '..', 'x' * 32):
+            response = self.client.get(f'/api/debug/profiles/{name}/')
+            self.assertEqual(response.status_code, 404, name)
+        self.profile()
+        self.assertFalse(os.path.exists(path))
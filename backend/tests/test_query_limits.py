@@ -0,0 +1,40 @@
+from django.test import TestCase
+from recipes.feed import fan_out
+from users.models import Subscription
+
+from .fixtures import TempMediaMixin, client_for, make_recipe, make_user
+
+
+class QueryLimitTest(TempMediaMixin, TestCase):
+    """limit вне диапазона приводится к нему, не число — 400."""
+
+    def setUp(self):
+        reader = make_user('reader')
+        author = make_user('author')
+        Subscription.objects.create(subscriber=reader, user=author)
+        self.recipe = make_recipe(author, 'борщ')
+        fan_out(self.recipe)
+        self.client = client_for(reader)
+
+    def assert_limits(self, path, **params):
+        for limit in ('0', '-1', '100000'):
+            response = self.client.get(path, {**params, 'limit': limit})
+            self.assertEqual(response.status_code, 200, limit)
+        response = self.client.get(path, {**params, 'limit': 'много'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('limit', response.data)
+
+    def test_feed(self):
+        self.assert_limits('/api/recipes/feed/')
+        response = self.client.get('/api/recipes/feed/', {'limit': 0})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_similar(self):
+        self.assert_limits(f'/api/recipes/{self.recipe.pk}/similar/')
+
+    def test_changes(self):
+        self.assert_limits('/api/changes/', since=0)
+        response = self.client.get('/api/changes/', {'since': -3})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/changes/', {'since': 'вчера'})
+        self.assertEqual(response.status_code, 400)
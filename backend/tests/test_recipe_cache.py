@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from .fixtures import (TempMediaMixin, client_for, make_ingredient,
+                       make_recipe, make_tag, make_user)
+
+
+class RecipeCacheInvalidationTest(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('alice')
+        self.tag = make_tag('breakfast')
+        self.ingredient = make_ingredient('яйцо', 'шт')
+        self.recipe = make_recipe(
+            self.author, 'омлет', tags=[self.tag],
+            ingredients=[(self.ingredient, 2)],
+        )
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.client = client_for(make_user('reader'))
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def test_author_rename(self):
+        first = self.get()
+        self.assertEqual(first.data['author']['username'], 'alice')
+        self.author.username = 'alicia'
+        self.author.save()
+        self.assertEqual(self.get().data['author']['username'], 'alicia')
+        listed = self.client.get('/api/recipes/').data['results'][0]
+        self.assertEqual(listed['author']['username'], 'alicia')
+
+    def test_tag_and_ingredient_rename(self):
+        self.get()
+        self.tag.name = 'Завтрак'
+        self.tag.save()
+        self.ingredient.name = 'перепелиное яйцо'
+        self.ingredient.save()
+        data = self.get().data
+        self.assertEqual(data['tags'][0]['name'], 'Завтрак')
+        self.assertEqual(data['ingredients'][0]['name'], 'перепелиное яйцо')
+
+    def test_etag_follows_body(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.author.username = 'alicia'
+        self.author.save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author']['username'], 'alicia')
+        self.assertNotEqual(response['ETag'], etag)
+        fresh = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 304)
@@ -0,0 +1,25 @@
+from django.test import TestCase
+from jobs.models import Job
+
+from .fixtures import TempMediaMixin, client_for, make_user
+
+
+class ShoppingCartExportTest(TempMediaMixin, TestCase):
+    """Синхронная выгрузка помечена устаревшей, новая идёт через очередь."""
+
+    def setUp(self):
+        self.client = client_for(make_user('reader'))
+
+    def test_download_is_deprecated(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Deprecation'], 'true')
+        self.assertEqual(
+            response['Link'],
+            '</api/recipes/shopping_cart_export/>; rel="successor-version"',
+        )
+
+    def test_export_enqueues_job(self):
+        response = self.client.post('/api/recipes/shopping_cart_export/')
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(Job.objects.filter(pk=response.data['id']).exists())
@@ -0,0 +1,57 @@
+import unittest
+
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from foodgram.slow_queries import (SlowQueryLogger, clear, explain_pending,
+                                   recorded)
+
+from .fixtures import make_user
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'нужен EXPLAIN')
+@override_settings(SLOW_QUERY_THRESHOLD=1e-9, SLOW_QUERY_SAMPLE_RATE=1)
+class SlowQueryExplainTest(TestCase):
+    """План снимается позже и без повторного выполнения запроса."""
+
+    def setUp(self):
+        clear()
+        self.addCleanup(clear)
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY SEQUENCE slow_query_probe')
+
+    def capture(self, sql, params=None):
+        request = RequestFactory().get('/api/tags/')
+        request.resolver_match = None
+        with connection.execute_wrapper(SlowQueryLogger(request)):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+
+    def test_explain_does_not_execute(self):
+        self.capture("SELECT nextval('slow_query_probe')")
+        query, = recorded()
+        self.assertEqual(query['plan'], '')
+        explain_pending([query])
+        self.assertIn('Result', query['plan'])
+        self.assertNotIn('actual time', query['plan'])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('slow_query_probe')")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_buffer_is_bounded(self):
+        with self.settings(SLOW_QUERY_BUFFER=3):
+            for _ in range(5):
+                self.capture('SELECT 1')
+            self.assertEqual(len(recorded()), 3)
+
+    def test_literals_are_redacted(self):
+        self.capture(
+            "SELECT id FROM users_user WHERE email = %s AND username = 'x'",
+            ['secret@example.com'],
+        )
+        admin = make_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.get(reverse('slow-queries'))
+        self.assertContains(response, 'email')
+        self.assertNotContains(response, 'secret@example.com')
+        self.assertNotContains(response, "'x'")
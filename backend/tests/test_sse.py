@@ -0,0 +1,62 @@
+from asgiref.sync import async_to_sync
+from api.sse import events_view
+from django.test import TransactionTestCase, override_settings
+from recipes import events
+from rest_framework.authtoken.models import Token
+
+from .fixtures import NO_THROTTLE, client_for, make_user
+
+
+@override_settings(
+    EVENTS_BACKEND='recipes.events.LocalBackend', THROTTLE=NO_THROTTLE
+)
+class EventsAuthTest(TransactionTestCase):
+    """В URL принимается только короткоживущий билет, не токен."""
+
+    def setUp(self):
+        self.addCleanup(setattr, events, '_backend', None)
+        self.addCleanup(setattr, events, '_started', False)
+        events._backend, events._started = None, False
+        self.user = make_user('reader')
+        self.token = Token.objects.create(user=self.user)
+
+    def open(self, query='', headers=()):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(events_view)({
+            'type': 'http', 'method': 'GET', 'path': '/api/events/',
+            'query_string': query.encode(), 'headers': list(headers),
+        }, receive, send)
+        return messages[0]['status']
+
+    def ticket(self):
+        response = client_for(self.user).post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['ticket']
+
+    def test_ticket_in_url(self):
+        self.assertEqual(self.open(f'ticket={self.ticket()}'), 200)
+
+    def test_token_in_header(self):
+        self.assertEqual(self.open(headers=[
+            (b'authorization', f'Token {self.token.key}'.encode()),
+        ]), 200)
+
+    def test_token_in_url_rejected(self):
+        self.assertEqual(self.open(f'token={self.token.key}'), 401)
+        self.assertEqual(self.open(f'ticket={self.token.key}'), 401)
+
+    def test_expired_ticket_rejected(self):
+        ticket = self.ticket()
+        with override_settings(EVENTS_TICKET_MAX_AGE=-1):
+            self.assertEqual(self.open(f'ticket={ticket}'), 401)
+
+    def test_ticket_needs_authentication(self):
+        response = client_for().post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,45 @@
+from api import throttling
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+
+class View:
+    throttle_costs = {}
+
+
+@override_settings(THROTTLE={
+    'user': (1.0, 10), 'anon': (1.0, 10), 'lease': 5, 'leases': 3,
+    'cache': 'default', 'timeout': 60,
+})
+class TokenBucketThrottleTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        throttling._leases.clear()
+        self.addCleanup(throttling._leases.clear)
+
+    def request(self, forwarded):
+        request = Request(APIRequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR=forwarded, REMOTE_ADDR='10.0.0.1'
+        ))
+        request.user = type('Anon', (), {'is_authenticated': False})()
+        return request
+
+    def test_ident_is_address_added_by_proxy(self):
+        throttle = throttling.TokenBucketThrottle()
+        key, _ = throttle.get_key(self.request('6.6.6.6, 203.0.113.7'))
+        self.assertEqual(key, 'anon:203.0.113.7')
+
+    def test_leases_are_bounded(self):
+        throttle = throttling.TokenBucketThrottle()
+        for number in range(10):
+            self.assertTrue(throttle.allow_request(
+                self.request(f'203.0.113.{number}'), View()
+            ))
+        self.assertEqual(len(throttling._leases), 3)
+        self.assertEqual(
+            list(throttling._leases),
+            [f'anon:203.0.113.{number}' for number in (7, 8, 9)],
+        )
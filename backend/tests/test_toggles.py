@@ -0,0 +1,129 @@
+import threading
+import unittest
+from collections import Counter
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from recipes.models import CartIngredientTotal, Favorite, ShoppingCart
+from recipes.services import cart_totals_from_cart
+from users.models import Subscription
+
+from .fixtures import (TempMediaMixin, client_for, make_ingredient,
+                       make_recipe, make_tag, make_user)
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'нужны параллельные транзакции'
+)
+class ConcurrentTogglesTest(TempMediaMixin, TransactionTestCase):
+    threads = 16
+    rounds = 10
+
+    def setUp(self):
+        self.user = make_user('reader')
+        self.author = make_user('author')
+        self.tag = make_tag('soup')
+        self.ingredients = [
+            make_ingredient('свёкла'), make_ingredient('капуста'),
+        ]
+        self.recipe = make_recipe(self.author, 'борщ', ingredients=[
+            (self.ingredients[0], 3), (self.ingredients[1], 2),
+        ], tags=[self.tag])
+
+    def hammer(self, path, users=None):
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def worker(method, user):
+            client = client_for(user)
+            try:
+                for _ in range(self.rounds):
+                    response = getattr(client, method)(path)
+                    with lock:
+                        statuses[method, response.status_code] += 1
+            finally:
+                connections.close_all()
+
+        workers = [
+            threading.Thread(target=worker, args=(
+                'post' if i % 2 else 'delete',
+                (users or [self.user])[i % len(users or [self.user])],
+            ))
+            for i in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertFalse(
+            [key for key in statuses if key[1] >= 500], statuses
+        )
+        return statuses[('post', 201)] - statuses[('delete', 204)]
+
+    def test_favorite(self):
+        net = self.hammer(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user).count(), net
+        )
+
+    def test_subscribe(self):
+        net = self.hammer(f'/api/users/{self.author.pk}/subscribe/')
+        self.assertEqual(
+            Subscription.objects.filter(subscriber=self.user).count(), net
+        )
+
+    def assert_totals(self):
+        totals = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in CartIngredientTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total'
+            )
+        }
+        self.assertEqual(totals, cart_totals_from_cart())
+
+    def test_shopping_cart_totals(self):
+        net = self.hammer(f'/api/recipes/{self.recipe.pk}/shopping_cart/')
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), net
+        )
+        self.assert_totals()
+
+    def test_shopping_cart_totals_during_edit(self):
+        users = [make_user(f'reader{number}') for number in range(4)]
+        done = threading.Event()
+        edits = Counter()
+
+        def editor():
+            client = client_for(self.author)
+            amount = 1
+            try:
+                while not done.is_set():
+                    amount += 1
+                    # Меняются и количества, и сам набор ингредиентов.
+                    ingredients = self.ingredients[:1 + amount % 2]
+                    response = client.patch(
+                        f'/api/recipes/{self.recipe.pk}/', {
+                            'tags': [self.tag.pk],
+                            'cooking_time': 5,
+                            'ingredients': [
+                                {'id': ingredient.pk, 'amount': amount}
+                                for ingredient in ingredients
+                            ],
+                        }, format='json'
+                    )
+                    edits[response.status_code] += 1
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=editor)
+        thread.start()
+        try:
+            self.hammer(
+                f'/api/recipes/{self.recipe.pk}/shopping_cart/', users
+            )
+        finally:
+            done.set()
+            thread.join()
+        self.assertEqual(list(edits), [200])
+        self.assert_totals()
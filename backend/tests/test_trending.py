@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from recipes.models import Favorite, TrendingScore
+from recipes.services import delete_user
+from recipes.trending import refresh_trending
+
+from .fixtures import TempMediaMixin, client_for, make_recipe, make_user
+
+
+class RefreshTrendingTest(TempMediaMixin, TestCase):
+    """Отметка не проходит мимо событий, которые ещё могут появиться."""
+
+    def setUp(self):
+        author = make_user('author')
+        self.recipes = [
+            make_recipe(author, f'рецепт {number}') for number in range(3)
+        ]
+        self.users = [make_user(f'user{number}') for number in range(3)]
+
+    def favorite(self, user, recipe, age):
+        favorite = Favorite.objects.create(user=user, recipe=recipe)
+        Favorite.objects.filter(pk=favorite.pk).update(
+            created_at=timezone.now() - timedelta(seconds=age)
+        )
+        return favorite
+
+    def scored(self):
+        return set(TrendingScore.objects.values_list('recipe_id', flat=True))
+
+    def test_fresh_event_holds_watermark(self):
+        first = self.favorite(self.users[0], self.recipes[0], 600)
+        fresh = self.favorite(self.users[1], self.recipes[1], 0)
+        self.favorite(self.users[2], self.recipes[2], 600)
+        state = refresh_trending()
+        self.assertEqual(state.last_favorite_id, first.pk)
+        self.assertEqual(self.scored(), {self.recipes[0].pk})
+        Favorite.objects.filter(pk=fresh.pk).update(
+            created_at=timezone.now() - timedelta(seconds=600)
+        )
+        state = refresh_trending()
+        self.assertEqual(
+            self.scored(), {recipe.pk for recipe in self.recipes}
+        )
+        score = TrendingScore.objects.get(recipe=self.recipes[0]).score
+        refresh_trending()
+        self.assertEqual(
+            TrendingScore.objects.get(recipe=self.recipes[0]).score, score
+        )
+
+
+class TrendingOrderingTest(TempMediaMixin, TestCase):
+    """ordering=trending отдаёт рецепты с рейтингом по убыванию."""
+
+    def test_ordering(self):
+        author = make_user('author')
+        recipes = [
+            make_recipe(author, f'рецепт {number}') for number in range(3)
+        ]
+        TrendingScore.objects.create(recipe=recipes[0], score=1)
+        TrendingScore.objects.create(recipe=recipes[2], score=2)
+        response = client_for().get(
+            '/api/recipes/', {'ordering': 'trending'}
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [recipes[2].pk, recipes[0].pk],
+        )
+
+
+@override_settings(TRENDING_SETTLE=0)
+class TrendingWithdrawTest(TempMediaMixin, TestCase):
+    """Удаление учтённой строки вычитает её вклад из рейтинга."""
+
+    def setUp(self):
+        self.recipe = make_recipe(make_user('author'), 'рецепт')
+        self.users = [make_user(f'user{number}') for number in range(2)]
+        self.url = f'/api/recipes/{self.recipe.pk}/favorite/'
+
+    def score(self):
+        refresh_trending()
+        return TrendingScore.objects.filter(
+            recipe=self.recipe
+        ).values_list('score', flat=True).first()
+
+    def test_toggles_do_not_change_score(self):
+        for user in self.users:
+            client_for(user).post(self.url)
+        score = self.score()
+        client = client_for(self.users[0])
+        for _ in range(5):
+            self.assertEqual(client.delete(self.url).status_code, 204)
+            self.assertAlmostEqual(self.score(), score / 2)
+            self.assertEqual(client.post(self.url).status_code, 201)
+            self.assertAlmostEqual(self.score(), score, places=5)
+        client_for(self.users[1]).delete(self.url)
+        client.delete(self.url)
+        self.assertIsNone(self.score())
+
+    def test_delete_user(self):
+        for user in self.users:
+            client_for(user).post(self.url)
+        score = self.score()
+        delete_user(self.users[0])
+        self.assertAlmostEqual(self.score(), score / 2)
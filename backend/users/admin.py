@@ -2,6 +2,10 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
 
+from foodgram.admin_filters import input_filter
+from foodgram.paginators import EstimatedCountPaginator
+from recipes.services import delete_user
+
 from .models import Subscription
 
 User = get_user_model()
@@ -10,10 +14,43 @@ User = get_user_model()
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     list_display = ('last_name', 'first_name', 'username', 'email')
-    list_filter = ('username', 'email',)
+    list_filter = ('is_staff', 'is_active')
+    # Только индексируемые условия: начало имени и точная почта.
+    search_fields = ('username__startswith', 'email__exact')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('bulk_delete',)
+
+    # Стандартное удаление тоже идёт через delete_user: рецепты
+    # пользователя вычитаются из чужих корзин.
+    def delete_model(self, request, obj):
+        delete_user(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            delete_user(user)
+
+    @admin.action(description='Быстро удалить выбранных пользователей',
+                  permissions=('delete',))
+    def bulk_delete(self, request, queryset):
+        for user in queryset:
+            deleted, seconds = delete_user(user)
+            self.message_user(
+                request,
+                f'{user}: удалено строк {sum(deleted.values())} '
+                f'за {seconds:.2f} с'
+            )
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'subscriber')
-    list_filter = ('user', 'subscriber')
+    list_filter = (
+        input_filter('user__username', 'автору'),
+        input_filter('subscriber__username', 'подписчику'),
+    )
+    list_select_related = ('user', 'subscriber')
+    search_fields = ('user__username__startswith',)
+    autocomplete_fields = ('user', 'subscriber')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False